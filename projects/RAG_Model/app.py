@@ -84,6 +84,22 @@ def load_documents(file_paths: List[str]) -> List:
     
     return documents
 
+# Texts per OpenAI embeddings request (API limit: 2048 inputs per call)
+OPENAI_EMBEDDING_BATCH_SIZE = 512
+
+@st.cache_resource
+def get_embeddings(embedding_model: str, openai_key: str = ""):
+    """Create the embeddings client once per model and API key."""
+    if embedding_model == "openai":
+        return OpenAIEmbeddings(
+            openai_api_key=openai_key,
+            chunk_size=OPENAI_EMBEDDING_BATCH_SIZE
+        )
+    
+    # Use HuggingFace embeddings
+    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    return HuggingFaceEmbeddings(model_name=model_name)
+
 def create_vectorstore(documents: List, embedding_model: str, vectorstore_type: str = "faiss"):
     """Create a vector store from documents."""
     # Split documents
@@ -95,12 +111,7 @@ def create_vectorstore(documents: List, embedding_model: str, vectorstore_type:
     splits = text_splitter.split_documents(documents)
     
     # Create embeddings
-    if embedding_model == "openai":
-        embeddings = OpenAIEmbeddings(openai_api_key=st.session_state.openai_key)
-    else:
-        # Use HuggingFace embeddings
-        model_name = "sentence-transformers/all-MiniLM-L6-v2"
-        embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    embeddings = get_embeddings(embedding_model, st.session_state.openai_key)
     
     # Create vector store
     if vectorstore_type == "faiss":
@@ -110,6 +121,23 @@ def create_vectorstore(documents: List, embedding_model: str, vectorstore_type:
     
     return vectorstore, splits
 
+QA_PROMPT_TEMPLATE = """Use the following pieces of context to answer the question at the end. 
+    If you don't know the answer, just say that you don't know, don't try to make up an answer.
+    
+    Context: {context}
+    
+    Question: {question}
+    
+    Answer:"""
+
+@st.cache_resource
+def get_qa_prompt():
+    """Build the QA prompt template once per server process."""
+    return PromptTemplate(
+        template=QA_PROMPT_TEMPLATE,
+        input_variables=["context", "question"]
+    )
+
 def create_qa_chain(vectorstore, llm_model: str = "gpt-3.5-turbo"):
     """Create a QA chain from vector store."""
     # Create LLM
@@ -127,19 +155,7 @@ def create_qa_chain(vectorstore, llm_model: str = "gpt-3.5-turbo"):
         )
     
     # Create prompt template
-    prompt_template = """Use the following pieces of context to answer the question at the end. 
-    If you don't know the answer, just say that you don't know, don't try to make up an answer.
-    
-    Context: {context}
-    
-    Question: {question}
-    
-    Answer:"""
-    
-    PROMPT = PromptTemplate(
-        template=prompt_template,
-        input_variables=["context", "question"]
-    )
+    PROMPT = get_qa_prompt()
     
     # Create QA chain
     qa_chain = RetrievalQA.from_chain_type(
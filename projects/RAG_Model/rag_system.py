@@ -8,6 +8,7 @@ import json
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 import pickle
+from collections import OrderedDict
 from datetime import datetime
 
 try:
@@ -29,6 +30,26 @@ try:
 except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
 
+try:
+    # pip install faiss-cpu>=1.7.4 (wheels ship AVX2 kernels)
+    import faiss
+    # The FAISS store needs numpy even without sentence-transformers
+    import numpy as np
+    faiss.omp_set_num_threads(int(os.getenv("FAISS_THREADS", os.cpu_count() or 1)))
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Index selection thresholds for the fallback store (see _index_factory_string)
+IVF_THRESHOLD = 10_000
+PQ_THRESHOLD = 100_000
+MAX_TRAINING_VECTORS = 256_000
+ADD_CHUNK_SIZE = 65_536
+IVF_NPROBE = 16
+
+# FAISS vector encodings for the fallback store, keyed by embedding_dtype
+VECTOR_ENCODINGS = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
 
 class RAGSystem:
     """
@@ -42,7 +63,11 @@ class RAGSystem:
         vector_store_path: Optional[str] = None,
         llm_model: str = "llama3.1:8b",
         chunk_size: int = 1000,
-        chunk_overlap: int = 200
+        chunk_overlap: int = 200,
+        embedding_cache_size: int = 100_000,
+        embedding_batch_size: int = 32,
+        index_factory: str = "auto",
+        embedding_dtype: str = "float32"
     ):
         """
         Initialize the RAG system.
@@ -53,17 +78,36 @@ class RAGSystem:
             llm_model: LLM model name (for Ollama)
             chunk_size: Size of text chunks
             chunk_overlap: Overlap between chunks
+            embedding_cache_size: Maximum number of cached text embeddings
+            embedding_batch_size: Number of texts encoded per model call
+            index_factory: FAISS index factory string for the fallback store,
+                or "auto" to pick one from the corpus size
+            embedding_dtype: Storage precision for fallback store vectors:
+                "float32", "float16" or "int8" (scalar quantized)
         """
         self.embedding_model_name = embedding_model
         self.vector_store_path = vector_store_path or "vector_store"
         self.llm_model = llm_model
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_batch_size = embedding_batch_size
+        if embedding_dtype not in VECTOR_ENCODINGS:
+            raise ValueError(
+                f"Unsupported embedding_dtype: {embedding_dtype}. "
+                f"Choose from {list(VECTOR_ENCODINGS)}"
+            )
+        self.index_factory = index_factory
+        self.embedding_dtype = embedding_dtype
+        
+        # LRU cache of text -> embedding, kept across calls
+        self._embedding_cache: OrderedDict = OrderedDict()
         
         # Initialize components
         self.text_splitter = None
         self.embeddings = None
         self.vector_store = None
+        self.index = None
         self.qa_chain = None
         
         self._initialize_components()
@@ -82,6 +126,8 @@ class RAGSystem:
             )
         elif SENTENCE_TRANSFORMERS_AVAILABLE:
             print("Using sentence-transformers directly (langchain not available)")
+            if FAISS_AVAILABLE:
+                print(f"FAISS compile options: {faiss.get_compile_options()}")
             self.embeddings_model = SentenceTransformer(self.embedding_model_name)
         else:
             raise ImportError(
@@ -89,6 +135,122 @@ class RAGSystem:
                 "Install at least one: pip install sentence-transformers"
             )
     
+    def embed_documents(self, texts: List[str]) -> "np.ndarray":
+        """
+        Embed texts, reusing cached embeddings for texts seen before.
+        
+        Duplicate texts (e.g. boilerplate headers and footers) are only
+        encoded once per call and served from the cache afterwards. Texts
+        are encoded in length-sorted batches so each batch pads to a
+        similar length.
+        
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            Array of embeddings, one row per input text
+        """
+        cache = self._embedding_cache
+        missing = [text for text in dict.fromkeys(texts) if text not in cache]
+        missing.sort(key=len)
+        
+        batch_size = self.embedding_batch_size
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            encoded = self.embeddings_model.encode(batch, batch_size=batch_size)
+            for text, vector in zip(batch, encoded):
+                cache[text] = vector
+        
+        vectors = []
+        for text in texts:
+            cache.move_to_end(text)
+            vectors.append(cache[text])
+        
+        while len(cache) > self.embedding_cache_size:
+            cache.popitem(last=False)
+        
+        return np.array(vectors)
+    
+    def clear_cache(self):
+        """Clear the embedding cache."""
+        self._embedding_cache.clear()
+    
+    def _index_factory_string(self, n: int, d: int) -> str:
+        """
+        Pick a FAISS index factory string for n vectors of dimension d.
+        
+        "auto" uses an exact flat index for small stores, IVF with sqrt(n)
+        lists for medium ones and IVF-PQ (d/4 sub-quantizers, 8 bits each)
+        for large ones, cutting stored vector size by 8x. Flat and IVF
+        vectors are stored at the precision set by embedding_dtype.
+        """
+        if self.index_factory != "auto":
+            return self.index_factory
+        
+        encoding = VECTOR_ENCODINGS[self.embedding_dtype]
+        if n < IVF_THRESHOLD:
+            return encoding
+        
+        nlist = int(np.sqrt(n))
+        if n > PQ_THRESHOLD and d % 4 == 0:
+            return f"IVF{nlist},PQ{d // 4}x8"
+        return f"IVF{nlist},{encoding}"
+    
+    def _build_index(self, embeddings: "np.ndarray"):
+        """
+        Build a FAISS index over embeddings for the fallback store.
+        
+        Vectors are L2-normalized so L2 distance ranks like cosine similarity.
+        
+        Args:
+            embeddings: Array of embeddings, one row per chunk
+            
+        Returns:
+            Populated FAISS index, or None if FAISS is not installed
+        """
+        if not FAISS_AVAILABLE:
+            return None
+        
+        # Copy: normalize_L2 works in place and the caller's embeddings must stay raw
+        vectors = np.array(embeddings, dtype=np.float32, copy=True)
+        faiss.normalize_L2(vectors)
+        n, d = vectors.shape
+        
+        factory = self._index_factory_string(n, d)
+        index = faiss.index_factory(d, factory)
+        if factory.startswith("IVF"):
+            faiss.ParameterSpace().set_index_parameter(index, "nprobe", IVF_NPROBE)
+        if not index.is_trained:
+            if n > MAX_TRAINING_VECTORS:
+                sample = np.random.default_rng(0).choice(n, MAX_TRAINING_VECTORS, replace=False)
+                index.train(vectors[sample])
+            else:
+                index.train(vectors)
+        
+        for start in range(0, n, ADD_CHUNK_SIZE):
+            index.add(vectors[start:start + ADD_CHUNK_SIZE])
+        return index
+    
+    def split_text_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Compute fallback chunk boundaries as (start, end) offsets into text.
+        
+        Callers that only need positions (e.g. tokenizers taking offsets)
+        can index the original string instead of copying each chunk.
+        
+        Args:
+            text: Document text
+            
+        Returns:
+            List of (start, end) offsets, one per chunk
+        """
+        step = self.chunk_size - self.chunk_overlap
+        length = len(text)
+        return [
+            (start, min(start + self.chunk_size, length))
+            for start in range(0, length, step)
+        ]
+    
     def load_documents(self, file_paths: List[str]) -> List[str]:
         """
         Load documents from file paths.
@@ -149,17 +311,17 @@ class RAGSystem:
             # Fallback: simple chunking and embedding
             chunks = []
             for doc in documents:
-                for i in range(0, len(doc), self.chunk_size - self.chunk_overlap):
-                    chunk = doc[i:i + self.chunk_size]
-                    chunks.append(chunk)
+                chunks.extend(doc[start:end] for start, end in self.split_text_spans(doc))
             
             # Create embeddings
-            embeddings = self.embeddings_model.encode(chunks)
+            embeddings = self.embed_documents(chunks)
             
             # Store in simple format
             store_data = {
                 'chunks': chunks,
-                'embeddings': embeddings.tolist(),
+                'embeddings': embeddings.astype(
+                    np.float32 if self.embedding_dtype == "float32" else np.float16
+                ),
                 'model': self.embedding_model_name,
                 'created_at': datetime.now().isoformat()
             }
@@ -169,6 +331,7 @@ class RAGSystem:
                 pickle.dump(store_data, f)
             
             self.vector_store = store_data
+            self.index = self._build_index(embeddings)
             print(f"Vector store saved to {self.vector_store_path}/store.pkl")
     
     def load_vector_store(self):
@@ -189,6 +352,7 @@ class RAGSystem:
             if os.path.exists(store_path):
                 with open(store_path, 'rb') as f:
                     self.vector_store = pickle.load(f)
+                self.index = self._build_index(np.asarray(self.vector_store['embeddings']))
                 print(f"Vector store loaded from {store_path}")
             else:
                 raise FileNotFoundError(f"Vector store not found at {store_path}")
@@ -218,26 +382,75 @@ class RAGSystem:
                 for doc, score in docs
             ]
         else:
-            # Simple cosine similarity search
-            query_embedding = self.embeddings_model.encode([query])[0]
-            embeddings = np.array(self.vector_store['embeddings'])
+            return self.retrieve_batch([query], k=k)[0]
+    
+    def retrieve_batch(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """
+        Retrieve relevant documents for several queries at once.
+        
+        Without langchain, all queries are embedded together and scored
+        with a single search over the (n_queries, dim) query matrix.
+        
+        Args:
+            queries: List of query strings
+            k: Number of documents to retrieve per query
             
-            # Calculate cosine similarity
-            scores = np.dot(embeddings, query_embedding) / (
-                np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
+        Returns:
+            One list of relevant document chunks per query
+        """
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized. Load or create one first.")
+        
+        if LANGCHAIN_AVAILABLE:
+            return [self.retrieve(query, k=k) for query in queries]
+        
+        query_embeddings = np.ascontiguousarray(self.embed_documents(queries), dtype=np.float32)
+        
+        if self.index is not None:
+            faiss.normalize_L2(query_embeddings)
+            distances, indices = self.index.search(query_embeddings, k)
+            # Squared L2 between unit vectors maps back to cosine similarity
+            scores = 1.0 - distances / 2.0
+        else:
+            # Simple cosine similarity search
+            embeddings = np.asarray(self.vector_store['embeddings'], dtype=np.float32)
+            scores = (query_embeddings @ embeddings.T) / np.outer(
+                np.linalg.norm(query_embeddings, axis=1),
+                np.linalg.norm(embeddings, axis=1)
             )
             
-            # Get top k
-            top_indices = np.argsort(scores)[::-1][:k]
-            
-            return [
+            # Get top k per query
+            indices = np.argsort(-scores, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, indices, axis=1)
+        
+        chunks = self.vector_store['chunks']
+        return [
+            [
                 {
-                    'content': self.vector_store['chunks'][idx],
-                    'score': float(scores[idx]),
+                    'content': chunks[idx],
+                    'score': float(score),
                     'metadata': {'index': int(idx)}
                 }
-                for idx in top_indices
+                for score, idx in zip(row_scores, row_indices)
+                if idx >= 0
             ]
+            for row_scores, row_indices in zip(scores, indices)
+        ]
+    
+    def reconstruct_batch(self, ids: List[int]) -> "np.ndarray":
+        """
+        Return the stored embeddings for the given chunk indices.
+        
+        Args:
+            ids: Chunk indices, as returned in retrieval metadata
+            
+        Returns:
+            Array of embeddings, one row per id
+        """
+        if self.vector_store is None or LANGCHAIN_AVAILABLE:
+            raise ValueError("Reconstruction requires the fallback vector store.")
+        
+        return np.asarray(self.vector_store['embeddings'], dtype=np.float32)[ids]
     
     def generate(self, query: str, k: int = 5) -> str:
         """
@@ -4,24 +4,254 @@ LiteLLM Proxy Server
 A simple proxy server using LiteLLM to unify LLM API calls.
 """
 
+import asyncio
+import hashlib
+import importlib.util
+import json
 import os
 import sys
-from typing import Optional
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from pydantic_core import to_json
 import uvicorn
 
 try:
-    from litellm import completion, acompletion
+    import litellm
+    from litellm import acompletion
     LITELLM_AVAILABLE = True
 except ImportError:
     LITELLM_AVAILABLE = False
     print("Warning: litellm not available. Install with: pip install litellm")
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+UVLOOP_AVAILABLE = importlib.util.find_spec("uvloop") is not None
+HTTPTOOLS_AVAILABLE = importlib.util.find_spec("httptools") is not None
+
+
+def dump_json(content) -> bytes:
+    """Serialize content to JSON bytes, using orjson when it is installed."""
+    if orjson is None:
+        return json.dumps(content, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(content)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson when it is installed."""
+    
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+class ResponseCache:
+    """In-process LRU cache of chat responses with a time-to-live."""
+    
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+    
+    @staticmethod
+    def make_key(payload: dict) -> str:
+        """Hash a canonicalized request payload into a cache key."""
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: str, value: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("CACHE_MAXSIZE", 10_000)),
+    ttl=float(os.getenv("CACHE_TTL", 300)),
+)
+
+
+@dataclass
+class Endpoint:
+    """An upstream LLM endpoint with its own concurrency limit."""
+    
+    base_url: str
+    api_key: Optional[str] = None
+    models: Optional[List[str]] = None  # None means the endpoint serves every model
+    concurrency_limit: int = 64
+    in_flight: int = field(default=0, init=False)
+    
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency_limit)
+    
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+
+class UpstreamPool:
+    """
+    Dispatch completions to the least-loaded upstream endpoint.
+    
+    On failure the request is retried on the next endpoint when fallback
+    is enabled. With no endpoints configured, calls go straight to
+    litellm using its own environment-based routing.
+    """
+    
+    def __init__(self, endpoints: Optional[List[Endpoint]] = None, fallback: bool = True):
+        self.endpoints = endpoints or []
+        self.fallback = fallback
+    
+    @classmethod
+    def from_env(cls) -> "UpstreamPool":
+        """Build a pool from the LITELLM_ENDPOINTS_JSON environment variable."""
+        raw = os.getenv("LITELLM_ENDPOINTS_JSON")
+        if not raw:
+            return cls()
+        config = json.loads(raw)
+        if isinstance(config, list):
+            config = {"endpoints": config}
+        return cls(
+            endpoints=[Endpoint(**entry) for entry in config.get("endpoints", [])],
+            fallback=config.get("fallback", True),
+        )
+    
+    def candidates(self, model: str) -> List[Endpoint]:
+        """Endpoints serving a model, least loaded first."""
+        return sorted(
+            (endpoint for endpoint in self.endpoints if endpoint.serves(model)),
+            key=lambda endpoint: endpoint.in_flight / endpoint.concurrency_limit,
+        )
+    
+    async def completion(self, **params):
+        """Run acompletion on the best endpoint, failing over on errors."""
+        candidates = self.candidates(params["model"])
+        if not candidates:
+            return await acompletion(**params)
+        
+        last_error = None
+        for endpoint in candidates:
+            async with endpoint.semaphore:
+                endpoint.in_flight += 1
+                try:
+                    return await acompletion(
+                        api_base=endpoint.base_url,
+                        api_key=endpoint.api_key,
+                        **params
+                    )
+                except Exception as e:
+                    last_error = e
+                    if not self.fallback:
+                        raise
+                finally:
+                    endpoint.in_flight -= 1
+        raise last_error
+    
+    async def stream(self, **params):
+        """Stream chunks from the best endpoint, holding its slot until the stream ends.
+        
+        Failover only happens while opening the stream; once chunks have
+        been yielded, errors propagate to the caller.
+        """
+        candidates = self.candidates(params["model"])
+        if not candidates:
+            async for chunk in await acompletion(stream=True, **params):
+                yield chunk
+            return
+        
+        last_error = None
+        for endpoint in candidates:
+            async with endpoint.semaphore:
+                endpoint.in_flight += 1
+                try:
+                    try:
+                        response = await acompletion(
+                            api_base=endpoint.base_url,
+                            api_key=endpoint.api_key,
+                            stream=True,
+                            **params
+                        )
+                    except Exception as e:
+                        last_error = e
+                        if not self.fallback:
+                            raise
+                        continue
+                    async for chunk in response:
+                        yield chunk
+                    return
+                finally:
+                    endpoint.in_flight -= 1
+        raise last_error
+
+
+upstream_pool = UpstreamPool.from_env()
+
+# Maximum number of in-flight upstream calls per batch request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 32))
 
-app = FastAPI(title="LiteLLM Proxy Server")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one pooled HTTP client across all upstream calls."""
+    http_client = None
+    if LITELLM_AVAILABLE and httpx is not None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            http2=HTTP2_AVAILABLE,
+        )
+        litellm.aclient_session = http_client
+    app.state.http = http_client
+    
+    yield
+    
+    if http_client is not None:
+        await http_client.aclose()
+
+
+app = FastAPI(
+    title="LiteLLM Proxy Server",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # CORS middleware
 app.add_middleware(
@@ -33,12 +263,20 @@ app.add_middleware(
 )
 
 
+# Request models are validated once by pydantic-core and never mutated
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True)
+
+
 class ChatMessage(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     role: str
     content: str
 
 
 class ChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     model: str
     messages: list[ChatMessage]
     temperature: Optional[float] = 0.7
@@ -46,6 +284,10 @@ class ChatRequest(BaseModel):
     stream: Optional[bool] = False
 
 
+class BatchRequest(BaseModel):
+    requests: list[ChatRequest]
+
+
 class ChatResponse(BaseModel):
     id: str
     object: str = "chat.completion"
@@ -55,27 +297,18 @@ class ChatResponse(BaseModel):
     usage: Optional[dict] = None
 
 
-@app.get("/")
-async def root():
-    """Root endpoint."""
-    return {
-        "service": "LiteLLM Proxy Server",
-        "status": "running",
-        "litellm_available": LITELLM_AVAILABLE
-    }
-
+# Static responses, serialized once at import time
+ROOT_JSON = dump_json({
+    "service": "LiteLLM Proxy Server",
+    "status": "running",
+    "litellm_available": LITELLM_AVAILABLE
+})
 
-@app.get("/health")
-async def health():
-    """Health check endpoint."""
-    return {"status": "healthy", "litellm_available": LITELLM_AVAILABLE}
+HEALTH_JSON = dump_json({"status": "healthy", "litellm_available": LITELLM_AVAILABLE})
 
-
-@app.get("/models")
-async def list_models():
-    """List available models."""
-    # Return common models - customize based on your setup
-    models = [
+# Common models - customize based on your setup
+MODELS_JSON = dump_json({
+    "data": [
         {
             "id": "gpt-3.5-turbo",
             "object": "model",
@@ -100,8 +333,91 @@ async def list_models():
             "created": 1677610602,
             "owned_by": "ollama"
         }
-    ]
-    return {"data": models, "object": "list"}
+    ],
+    "object": "list"
+})
+
+
+@app.get("/")
+async def root():
+    """Root endpoint."""
+    return Response(content=ROOT_JSON, media_type="application/json")
+
+
+@app.get("/health")
+async def health():
+    """Health check endpoint."""
+    return Response(content=HEALTH_JSON, media_type="application/json")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss counters."""
+    return response_cache.stats()
+
+
+@app.get("/models")
+@app.get("/v1/models")
+async def list_models():
+    """List available models."""
+    return Response(content=MODELS_JSON, media_type="application/json")
+
+
+def build_params(request: ChatRequest) -> dict:
+    """Translate a ChatRequest into litellm completion parameters."""
+    # Convert messages to dict format in one pydantic-core pass
+    messages = request.model_dump(include={"messages"})["messages"]
+    
+    params = {
+        "model": request.model,
+        "messages": messages,
+        "temperature": request.temperature,
+    }
+    
+    if request.max_tokens:
+        params["max_tokens"] = request.max_tokens
+    
+    return params
+
+
+async def complete_chat(request: ChatRequest, params: dict) -> dict:
+    """Run a non-streaming chat completion, using the response cache when possible."""
+    # Deterministic (temperature 0) requests are served from the cache
+    cache_key = None
+    if request.temperature == 0:
+        cache_key = ResponseCache.make_key(params)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    # Non-streaming response (awaited so the event loop stays free)
+    response = await upstream_pool.completion(**params)
+    
+    # Format response in OpenAI-compatible format
+    result = {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": 1677610602,
+        "model": request.model,
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": response.choices[0].message.content
+            },
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": 0,  # LiteLLM doesn't always provide this
+            "completion_tokens": 0,
+            "total_tokens": 0
+        }
+    }
+    
+    if cache_key is not None:
+        response_cache.set(cache_key, result)
+    
+    return result
 
 
 @app.post("/v1/chat/completions")
@@ -116,60 +432,53 @@ async def chat_completions(request: ChatRequest):
         )
     
     try:
-        # Convert messages to dict format
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        # Prepare parameters
-        params = {
-            "model": request.model,
-            "messages": messages,
-            "temperature": request.temperature,
-        }
-        
-        if request.max_tokens:
-            params["max_tokens"] = request.max_tokens
+        params = build_params(request)
         
         # Handle streaming
         if request.stream:
             async def generate():
                 try:
-                    response = await acompletion(**params, stream=True)
-                    async for chunk in response:
-                        yield f"data: {chunk.model_dump_json()}\n\n"
-                    yield "data: [DONE]\n\n"
+                    # The endpoint slot stays held until the last chunk is sent
+                    async for chunk in upstream_pool.stream(**params):
+                        yield b"data: " + to_json(chunk) + b"\n\n"
+                    yield b"data: [DONE]\n\n"
                 except Exception as e:
-                    yield f"data: {{\"error\": \"{str(e)}\"}}\n\n"
+                    yield b"data: " + dump_json({"error": str(e)}) + b"\n\n"
             
             return StreamingResponse(generate(), media_type="text/event-stream")
         
-        # Non-streaming response
-        response = completion(**params)
-        
-        # Format response in OpenAI-compatible format
-        return {
-            "id": f"chatcmpl-{hash(str(response))}",
-            "object": "chat.completion",
-            "created": 1677610602,
-            "model": request.model,
-            "choices": [{
-                "index": 0,
-                "message": {
-                    "role": "assistant",
-                    "content": response.choices[0].message.content
-                },
-                "finish_reason": "stop"
-            }],
-            "usage": {
-                "prompt_tokens": 0,  # LiteLLM doesn't always provide this
-                "completion_tokens": 0,
-                "total_tokens": 0
-            }
-        }
+        return await complete_chat(request, params)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/v1/chat/completions/batch")
+async def chat_completions_batch(body: BatchRequest):
+    """
+    Run several non-streaming chat completions concurrently.
+    
+    Results are returned in request order; a failed request yields an
+    {"error": ...} entry instead of failing the whole batch.
+    """
+    if not LITELLM_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="LiteLLM not available. Install with: pip install litellm"
+        )
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def run_one(request: ChatRequest) -> dict:
+        async with semaphore:
+            try:
+                return await complete_chat(request, build_params(request))
+            except Exception as e:
+                return {"error": str(e)}
+    
+    return await asyncio.gather(*(run_one(request) for request in body.requests))
+
+
 @app.post("/v1/completions")
 async def completions(request: dict):
     """
@@ -182,7 +491,7 @@ async def completions(request: dict):
         )
     
     try:
-        response = completion(
+        response = await upstream_pool.completion(
             model=request.get("model", "gpt-3.5-turbo"),
             prompt=request.get("prompt", ""),
             temperature=request.get("temperature", 0.7),
@@ -190,7 +499,7 @@ async def completions(request: dict):
         )
         
         return {
-            "id": f"cmpl-{hash(str(response))}",
+            "id": f"cmpl-{uuid.uuid4().hex}",
             "object": "text_completion",
             "created": 1677610602,
             "model": request.get("model"),
@@ -217,5 +526,19 @@ if __name__ == "__main__":
         print("Install with: pip install litellm")
         print("Or install with proxy extras: pip install 'litellm[proxy]'")
     
-    uvicorn.run(app, host=host, port=port)
+    # Multiple workers and reload both need an import string; reload is single-process
+    reload = os.getenv("RELOAD", "").lower() in ("1", "true", "yes")
+    workers = 1 if reload else int(os.getenv("WORKERS", os.cpu_count() or 1))
+    print(f"Workers: {workers} (uvloop: {UVLOOP_AVAILABLE}, httptools: {HTTPTOOLS_AVAILABLE})")
+    
+    uvicorn.run(
+        "proxy_server:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=host,
+        port=port,
+        loop="uvloop" if UVLOOP_AVAILABLE else "asyncio",
+        http="httptools" if HTTPTOOLS_AVAILABLE else "h11",
+        workers=workers,
+        reload=reload,
+    )
 
@@ -4,62 +4,314 @@ Terminal Agents - Production-Ready AI Coding Assistant
 A comprehensive terminal-based AI agent for code assistance, similar to OpenCode.
 """
 
-import os
+import re
 import sys
 import argparse
+import functools
+import importlib.util
+import io
 import json
+import mmap
+import os
+import threading
+import time
+import tokenize
+import traceback
+from itertools import islice
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Union
+from typing import Callable, Dict, Optional, List, Sequence, Tuple, Union
 from datetime import datetime
 
-# Try to import rich for beautiful terminal UI
-try:
-    from rich.console import Console
-    from rich.markdown import Markdown
-    from rich.panel import Panel
-    from rich.prompt import Prompt, Confirm
-    from rich.progress import Progress, SpinnerColumn, TextColumn
-    from rich.syntax import Syntax
-    from rich.table import Table
-    from rich import print as rprint
-    RICH_AVAILABLE = True
-except ImportError:
-    RICH_AVAILABLE = False
+# Rich (terminal UI) and prompt_toolkit (line editing) are checked without
+# importing them; their modules are loaded where first used to keep startup fast
+RICH_AVAILABLE = importlib.util.find_spec("rich") is not None
+if not RICH_AVAILABLE:
     print("⚠️  Rich library not available. Install with: pip install rich")
     print("   Falling back to plain text output.\n")
 
-# Try to import pygments for syntax highlighting
-try:
-    from pygments import highlight
-    from pygments.lexers import get_lexer_by_name, guess_lexer_for_filename
-    from pygments.formatters import TerminalFormatter
-    PYGMENTS_AVAILABLE = True
-except ImportError:
-    PYGMENTS_AVAILABLE = False
+PROMPT_TOOLKIT_AVAILABLE = importlib.util.find_spec("prompt_toolkit") is not None
 
-# Import LLM providers
+# Use orjson for transcript (de)serialization when available
 try:
-    from openai import OpenAI as OpenAIClient
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+    import orjson
 
-try:
-    from anthropic import Anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+    def _dumps_line(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
 
-try:
-    from langchain_community.llms import Ollama
-    from langchain.callbacks.manager import CallbackManager
-    from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-    OLLAMA_AVAILABLE = True
+    _loads = orjson.loads
 except ImportError:
-    OLLAMA_AVAILABLE = False
+    def _dumps_line(obj) -> bytes:
+        return json.dumps(obj, default=lambda o: o.isoformat()).encode("utf-8") + b"\n"
 
+    _loads = json.loads
+
+# Rich's Syntax highlighter needs pygments; checked without importing it
+PYGMENTS_AVAILABLE = importlib.util.find_spec("pygments") is not None
+
+# Provider SDKs (openai, anthropic, langchain) are imported lazily by
+# llm_providers when the selected provider is constructed
+
+from cache import ResponseCache
 from config import TerminalAgentConfig
-from llm_providers import LLMProvider, get_llm_provider
+from history_index import HistoryIndex
+from llm_providers import LLMProvider, Turn, get_llm_provider
+
+# Share of the context window the history may fill; the rest is left for the reply
+CONTEXT_BUDGET_RATIO = 0.8
+
+
+@functools.lru_cache(maxsize=8)
+def _token_encoding(model: str):
+    """tiktoken encoding for a model, or None when tiktoken is unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(role: str, content: str) -> int:
+    """Rough token estimate for a message, about four characters per token."""
+    return (len(content) + len(role)) // 4
+
+
+def trim_history(history: Sequence[Turn], budget: int) -> Sequence[Turn]:
+    """Fit a conversation into a token budget.
+    
+    System messages are always kept. Of the rest, the newest messages are
+    kept and the oldest dropped first, without leaving an assistant reply
+    whose prompt was dropped at the front. The last message is always kept.
+    
+    Args:
+        history: Conversation, oldest first, ending with the current message
+        budget: Maximum total tokens
+        
+    Returns:
+        ``history`` itself when it fits, otherwise the trimmed messages
+    """
+    def tokens(turn: Turn) -> int:
+        return turn.tokens if turn.tokens >= 0 else estimate_tokens(turn.role, turn.content)
+    
+    system_turns = [turn for turn in history if turn.role == "system"]
+    used = sum(tokens(turn) for turn in system_turns)
+    dialog = len(history) - len(system_turns)
+    
+    kept: List[Turn] = []
+    for turn in reversed(history):
+        if turn.role == "system":
+            continue
+        used += tokens(turn)
+        if used > budget and kept:
+            break
+        kept.append(turn)
+    
+    if len(kept) == dialog:
+        return history
+    if len(kept) > 1 and kept[-1].role == "assistant":
+        kept.pop()
+    kept.reverse()
+    return system_turns + kept
+
+
+# Rolling summary of messages that left the prompt window
+SUMMARY_MAX_CHARS = 2000
+SUMMARY_PREFIX = "[Summary of earlier turns]: "
+_SUMMARY_LINE_RE = re.compile(r'TODO|decided|error|file:', re.IGNORECASE)
+_FIRST_SENTENCE_RE = re.compile(r'^\s*(.+?[.!?])(?:\s|$)', re.DOTALL)
+
+
+def _tail_lines(buf, n: int):
+    """Find the last n non-empty lines of a bytes buffer by scanning backwards.
+    
+    Args:
+        buf: bytes or mmap
+        n: Maximum number of lines
+        
+    Returns:
+        (offset of the first returned line, lines in file order)
+    """
+    lines = []
+    end = len(buf)
+    start = end
+    while end > 0 and len(lines) < n:
+        start = buf.rfind(b"\n", 0, end) + 1
+        line = buf[start:end]
+        if line.strip():
+            lines.append(line)
+        end = start - 1
+    lines.reverse()
+    return start, lines
+
+
+def _parse_file_reports(text: str) -> Dict[str, List[str]]:
+    """Parse ``{"file": ..., "issues": [...]}`` JSON lines from a batch reply.
+    
+    Lines that are not such objects (code fences, stray prose) are skipped.
+    """
+    reports = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            report = _loads(line)
+        except ValueError:
+            continue
+        if isinstance(report, dict) and "file" in report:
+            reports[str(report["file"])] = [str(issue) for issue in report.get("issues") or []]
+    return reports
+
+
+def summarize_turns(turns: Sequence[Turn]) -> str:
+    """Heuristically compress messages without an LLM call.
+    
+    Keeps the first sentence of each user message plus any line that looks
+    like a decision, error, TODO or file reference.
+    
+    Args:
+        turns: Messages to summarize, oldest first
+        
+    Returns:
+        Summary text (empty if nothing was worth keeping)
+    """
+    parts: List[str] = []
+    for turn in turns:
+        if turn.role == "user":
+            match = _FIRST_SENTENCE_RE.match(turn.content)
+            first = (match.group(1) if match else turn.content.strip().split("\n", 1)[0])[:200]
+            if first:
+                parts.append(f"User: {first}")
+        for line in turn.content.splitlines():
+            line = line.strip()
+            if line and _SUMMARY_LINE_RE.search(line) and line[:200] not in parts:
+                parts.append(line[:200])
+    return " | ".join(parts)
+
+
+# Rich markup tags, stripped for plain-text output
+_MARKUP_RE = re.compile(r'\[.*?\]')
+
+
+@functools.lru_cache(maxsize=16)
+def _code_block_re(language: str) -> re.Pattern:
+    """Compiled pattern matching a fenced code block for a language."""
+    return re.compile(rf'```(?:{re.escape(language)}|python)?\n(.*?)```', re.DOTALL)
+
+
+@functools.lru_cache(maxsize=16)
+def _lexer(language: str):
+    """Pygments lexer for a language, loaded once (the name itself if unknown)."""
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+    try:
+        return get_lexer_by_name(language)
+    except ClassNotFound:
+        return language
+
+
+# Streamed tokens are coalesced and flushed once either threshold is reached
+STREAM_FLUSH_BYTES = 256
+STREAM_FLUSH_INTERVAL = 0.03
+
+# Number of source files whose contents are kept between commands
+FILE_CACHE_SIZE = 64
+
+# Share of the context window a source file may take in an analysis prompt
+# (~4 chars per token); larger files keep their head and tail and elide the middle
+SOURCE_BUDGET_RATIO = 0.6
+_ELISION = "\n… [truncated {n} bytes] …\n"
+
+# Persisted history larger than this is compacted to its tail on startup
+HISTORY_COMPACT_BYTES = 4 * 1024 * 1024
+
+# Share of the context window one multi-file analysis request may fill, and
+# the reply cap for such a request
+BATCH_BUDGET_RATIO = 0.5
+BATCH_MAX_TOKENS = 4096
+
+
+def _strip_comment_lines(code: str) -> str:
+    """Drop comment-only lines from Python source, leaving strings untouched.
+    
+    Source that does not tokenize (e.g. with an elided middle) is returned as-is.
+    """
+    lines = io.StringIO(code).readlines()
+    try:
+        drop = {
+            tok.start[0] for tok in tokenize.generate_tokens(iter(lines).__next__)
+            if tok.type == tokenize.COMMENT and not tok.line[:tok.start[1]].strip()
+        }
+    except (tokenize.TokenError, SyntaxError):
+        return code
+    if not drop:
+        return code
+    return "".join(line for number, line in enumerate(lines, 1) if number not in drop)
+
+
+# Static system prompts for the code helpers. Kept free of interpolation so the
+# prefix is byte-identical across calls and eligible for provider prompt caching.
+_ANALYZE_SYSTEM = """Analyze the code provided by the user and produce a comprehensive report including:
+1. Code quality issues
+2. Performance problems
+3. Security vulnerabilities
+4. Best practices violations
+5. Refactoring opportunities
+6. Suggestions for improvement
+
+Provide a detailed analysis."""
+
+_ANALYZE_BATCH_SYSTEM = """The user provides several code files, each starting with a line of the form
+--- FILE: <name> ---
+
+Analyze each file for code quality issues, performance problems, security
+vulnerabilities and best practices violations.
+
+Reply with exactly one JSON object per line, one line per file, and nothing else:
+{"file": "<name>", "issues": ["<issue and suggested fix>", ...]}"""
+
+_EXPLAIN_SYSTEM = """Explain the code provided by the user in detail, including:
+1. What the code does
+2. How it works (step by step)
+3. Key concepts and patterns used
+4. Potential use cases
+5. Any important considerations
+
+Provide a clear, educational explanation."""
+
+_GENERATE_SYSTEM = """Generate code in the requested language based on the user's description.
+
+Requirements:
+- Write clean, well-documented code
+- Include type hints if applicable
+- Add comments explaining key parts
+- Follow best practices for the language
+- Include error handling where appropriate
+
+Provide only the code with brief comments, no explanations outside the code."""
+
+_FIX_SYSTEM = """Fix the code provided by the user, addressing any bugs, errors, or issues.
+
+Provide the fixed code with explanations of what was changed."""
+
+_REFACTOR_SYSTEM = """Refactor the code provided by the user to improve quality, maintainability, and follow best practices.
+
+Provide the refactored code with explanations of improvements."""
+
+# generate asks for code only, so generation can end with the first fenced block
+# (fix and refactor explain their changes after the code)
+CODE_STOP = ("```\n\n",)
+
+# User-message templates; only the placeholders vary between calls
+_FILE_TMPL = "--- FILE: {name} ---\n{code}\n"
+_CODE_TMPL = "Code:\n```python\n{code}\n```"
+_GENERATE_TMPL = "Language: {language}\n\nDescription:\n{description}"
+_ISSUE_TMPL = "Specific issue to fix: {issue}\n\n"
+_GOAL_TMPL = "Refactoring goal: {goal}\n\n"
 
 
 class TerminalAgent:
@@ -70,7 +322,9 @@ class TerminalAgent:
         api_key: Optional[str] = None,
         model: Optional[str] = None,
         provider: Optional[str] = None,
-        config_path: Optional[str] = None
+        config_path: Optional[str] = None,
+        use_cache: Optional[bool] = None,
+        max_tokens: Optional[int] = None
     ):
         """Initialize the terminal agent.
         
@@ -79,6 +333,8 @@ class TerminalAgent:
             model: Model name to use (overrides config)
             provider: Provider name (overrides config)
             config_path: Path to config file
+            use_cache: Enable the response cache (overrides config)
+            max_tokens: Token cap for every command (overrides config; default is no cap)
         """
         self.config = TerminalAgentConfig(config_path=config_path)
         
@@ -89,19 +345,79 @@ class TerminalAgent:
             self.config.model = model
         if provider:
             self.config.provider = provider
+        if use_cache is not None:
+            self.config.cache_enabled = use_cache
+        if max_tokens:
+            self.config.max_tokens = max_tokens
         
         # Initialize console
-        self.console = Console() if RICH_AVAILABLE else None
+        self.console = None
+        if RICH_AVAILABLE:
+            from rich.console import Console
+            self.console = Console()
+        
+        # Status-line writers are bound once instead of branching on every call
+        if self.console:
+            from rich.markup import escape
+            self._out = self.console.print
+            self._escape = escape
+            self._err_prefix = "[red]✗ Error:[/red] "
+            self._ok_prefix = "[green]✓[/green] "
+        else:
+            self._out = print
+            self._escape = str
+            self._err_prefix = "Error: "
+            self._ok_prefix = "✓ "
         
         # Initialize LLM provider
         self.llm: Optional[LLMProvider] = None
         self._initialize_llm()
         
-        # Conversation history
-        self.conversation_history: List[Dict[str, str]] = []
+        # Conversation history, bounded so the oldest turns drop off first
+        self.conversation_history: deque = deque(maxlen=2 * self.config.history_max_turns)
+        
+        # Transcript cursor: total entries ever appended vs. entries already saved
+        self._history_count = 0
+        self._saved_count = 0
+        self._saved_path: Optional[Path] = None
+        
+        # Rolling summary of messages before absolute position _summary_upto
+        self._summary = ""
+        self._summary_upto = 0
+        
+        # Optional semantic retrieval over past messages
+        self._history_index: Optional[HistoryIndex] = None
+        if self.config.history_retrieval_k > 0:
+            try:
+                self._history_index = HistoryIndex(
+                    self.conversation_history.maxlen, self.config.embedding_model
+                )
+            except ImportError:
+                self._print("[yellow]History retrieval needs numpy and sentence-transformers; "
+                            "sending recent history instead.[/yellow]")
+        
+        # Response cache
+        self.cache: Optional[ResponseCache] = None
+        if self.config.cache_enabled:
+            self.cache = ResponseCache(
+                self.config.cache_path, maxsize=self.config.cache_size, ttl=self.config.cache_ttl
+            )
+        
+        # Worker pool for multi-file shortcuts; batch requests skip shared history
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        
+        # File contents keyed by (path, read budget), validated against (mtime, size)
+        self._file_cache: "OrderedDict[Tuple[Path, Optional[int]], tuple]" = OrderedDict()
+        self._file_lock = threading.Lock()
         
         # Working directory
         self.working_dir = Path.cwd()
+        
+        # Conversation persisted across runs, appended to as it grows
+        self._history_fd: Optional[int] = None
+        if self.config.persist_history:
+            self._restore_history()
 
     def _initialize_llm(self):
         """Initialize the LLM provider."""
@@ -119,19 +435,23 @@ class TerminalAgent:
                     print(f"✓ Using {self.llm.provider_name}: {self.llm.model_name}")
             else:
                 self._error("Failed to initialize LLM provider. Check your configuration.")
-                self._print("\n[bold]Setup Instructions:[/bold]")
-                self._print("1. Install Ollama (free, local): curl -fsSL https://ollama.ai/install.sh | sh")
-                self._print("2. Or set API keys: export OPENAI_API_KEY=your_key")
-                self._print("3. See README.md for more options")
+                self._print_panel("\n".join([
+                    "1. Install Ollama (free, local): curl -fsSL https://ollama.ai/install.sh | sh",
+                    "2. Or set API keys: export OPENAI_API_KEY=your_key",
+                    "3. See README.md for more options",
+                ]), title="Setup Instructions")
         except ImportError as e:
             self._error(f"Missing dependency: {e}")
-            self._print("\n[bold]Install missing dependencies:[/bold]")
-            self._print("pip install -r requirements.txt")
+            self._print_panel("pip install -r requirements.txt", title="Install missing dependencies")
         except Exception as e:
             self._error(f"Error initializing LLM: {e}")
-            import traceback
+            # The traceback is only formatted in verbose mode, and printed without
+            # markup parsing since it may contain brackets Rich would interpret
             if self.config.verbose:
-                self._print(f"\n[dim]{traceback.format_exc()}[/dim]")
+                if self.console:
+                    self.console.print("\n" + traceback.format_exc(), style="dim", markup=False, highlight=False)
+                else:
+                    print("\n" + traceback.format_exc())
 
     def _print(self, message: str, style: Optional[str] = None):
         """Print message with rich formatting if available."""
@@ -140,45 +460,70 @@ class TerminalAgent:
                 self.console.print(message, style=style)
             except Exception:
                 # Fallback if rich fails
-                import re
-                clean = re.sub(r'\[.*?\]', '', message)
-                print(clean)
+                print(_MARKUP_RE.sub('', message))
         else:
             # Strip rich markup
-            import re
-            clean = re.sub(r'\[.*?\]', '', message)
-            print(clean)
+            print(_MARKUP_RE.sub('', message))
 
-    def _error(self, message: str):
-        """Print error message."""
+    def _print_markdown(self, text: str):
+        """Render a response as Markdown, or print it as-is without Rich."""
         if self.console:
-            self.console.print(f"[red]✗ Error:[/red] {message}")
+            from rich.markdown import Markdown
+            self.console.print(Markdown(text))
         else:
-            print(f"Error: {message}")
+            print(text)
 
-    def _success(self, message: str):
-        """Print success message."""
+    def _print_panel(self, body: str, title: str):
+        """Print a titled block in a single render."""
         if self.console:
-            self.console.print(f"[green]✓[/green] {message}")
+            from rich.panel import Panel
+            self.console.print(Panel(body, title=f"[bold]{title}[/bold]", border_style="yellow"))
         else:
-            print(f"✓ {message}")
+            print(f"\n{title}:\n{body}")
+
+    def _error(self, message: str):
+        """Print error message."""
+        self._out(self._err_prefix + self._escape(message))
+
+    def _success(self, message: str):
+        """Print success message."""
+        self._out(self._ok_prefix + message)
 
     def _code_block(self, code: str, language: str = "python"):
         """Display code block with syntax highlighting."""
         if self.console and PYGMENTS_AVAILABLE:
-            syntax = Syntax(code, language, theme="monokai", line_numbers=True)
+            from rich.syntax import Syntax
+            syntax = Syntax(code, _lexer(language), theme="monokai", line_numbers=True)
             self.console.print(syntax)
         elif self.console:
+            from rich.panel import Panel
             self.console.print(Panel(code, title=f"[{language}]", border_style="blue"))
         else:
             print(f"\n```{language}\n{code}\n```")
 
-    def chat(self, message: str, stream: bool = True) -> str:
+    def chat(
+        self,
+        message: str,
+        stream: bool = True,
+        system: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[Sequence[str]] = None,
+        cache: bool = False
+    ) -> str:
         """Send a chat message to the agent.
         
+        With ``stream=True`` the response is displayed here as it arrives
+        (or rendered once if the provider cannot stream), so callers must not
+        print it again. With ``stream=False`` nothing is displayed.
+        
         Args:
             message: User message
-            stream: Whether to stream the response
+            stream: Whether to stream and display the response
+            system: Static system instructions for this request
+            max_tokens: Generation cap (defaults to the configured cap, if any)
+            stop: Sequences that end generation early
+            cache: Use the response cache. Only for self-contained prompts,
+                since the cache key ignores the conversation history
             
         Returns:
             Agent response
@@ -187,79 +532,448 @@ class TerminalAgent:
             self._error("LLM provider not initialized")
             return ""
         
+        if max_tokens is None:
+            max_tokens = self._max_tokens()
+        
+        # Batch workers run each request on its own, outside the shared history
+        isolated = getattr(self._local, "isolated", False)
+        
+        # Check the response cache before touching history. Only stateless
+        # requests are cached: a conversational reply depends on the whole history.
+        cache_key = None
+        if self.cache is not None and (cache or isolated):
+            cache_key = ResponseCache.make_key(
+                self.llm.provider_name, self.llm.model_name, message, (),
+                system=system, max_tokens=max_tokens, stop=stop
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if not isolated:
+                    self._append_history("user", message)
+                    self._append_history("assistant", cached)
+                if stream:
+                    self._print_markdown(cached)
+                return cached
+        
+        if isolated:
+            try:
+                response = self._close_stopped(
+                    self.llm.chat(message, system=system, max_tokens=max_tokens, stop=stop)
+                )
+                if cache_key and response:
+                    self.cache.set(cache_key, response)
+                return response
+            except Exception as e:
+                self._error(f"Chat error: {e}")
+                return ""
+        
         # Add to conversation history
-        self.conversation_history.append({"role": "user", "content": message})
+        self._append_history("user", message)
         
         try:
+            history = self._history_for_send(system)
             if stream and self.llm.supports_streaming:
-                response = self._stream_chat(message)
+                response = self._stream_chat(message, history, system, max_tokens, stop)
             else:
-                response = self.llm.chat(message, history=self.conversation_history)
+                response = self._close_stopped(
+                    self.llm.chat(message, history=history, system=system, max_tokens=max_tokens, stop=stop)
+                )
+                if stream:
+                    self._print_markdown(response)
             
             # Add response to history
-            self.conversation_history.append({"role": "assistant", "content": response})
+            self._append_history("assistant", response)
+            
+            if cache_key and response:
+                self.cache.set(cache_key, response)
             
             return response
         except Exception as e:
             self._error(f"Chat error: {e}")
             return ""
 
-    def _stream_chat(self, message: str) -> str:
-        """Stream chat response."""
-        if not self.console:
-            # Fallback to non-streaming
-            return self.llm.chat(message, history=self.conversation_history)
+    def _close_stopped(self, response: str) -> str:
+        """Restore a closing fence the provider consumed as a stop sequence.
+        
+        Only done when the provider reports that the stop sequence ended the
+        reply, so a reply cut off by the token cap stays visibly unclosed.
+        """
+        stop = getattr(self.llm, "last_stop", None)
+        if stop and response and response.count("```") % 2 == 1:
+            return response.rstrip("\n") + "\n" + stop
+        return response
+
+    def _max_tokens(self) -> Optional[int]:
+        """Reply cap set with --max-tokens or config (None: the provider's default)."""
+        return self.config.max_tokens or None
+
+    def _restore_history(self):
+        """Open the persisted history and load its most recent messages.
+        
+        The file is memory-mapped and scanned backwards, so only the messages
+        that fit in the history window are decoded however long it has grown.
+        """
+        try:
+            fd = os.open(self.config.history_file, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        except OSError as e:
+            print(f"Warning: Could not open history file: {e}")
+            return
+        self._history_fd = fd
         
-        full_response = ""
-        with self.console.status("[bold blue]Thinking...", spinner="dots"):
+        size = os.fstat(fd).st_size
+        if not size:
+            return
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            start, lines = _tail_lines(mm, self.conversation_history.maxlen)
+            complete = mm[size - 1:size] == b"\n"
+        if not complete:
+            os.write(fd, b"\n")  # keep new entries off an interrupted last line
+        entries = []
+        for line in lines:
             try:
-                for chunk in self.llm.stream_chat(message, history=self.conversation_history):
-                    if chunk:
-                        full_response += chunk
-                        self.console.print(chunk, end="")
-                self.console.print()  # New line after streaming
-            except Exception as e:
-                self._error(f"Streaming error: {e}")
-                # Fallback to non-streaming
-                full_response = self.llm.chat(message, history=self.conversation_history)
+                entry = _loads(line)
+                entries.append((entry["role"], entry["content"]))
+            except (ValueError, KeyError, TypeError):
+                continue  # e.g. a line cut short by an interrupted write
+        
+        for role, content in entries:
+            self._append_history(role, content, persist=False)
+        if start > HISTORY_COMPACT_BYTES:
+            self._truncate_history()
+            os.write(fd, b"".join(_dumps_line({"role": r, "content": c}) for r, c in entries))
+
+    def _truncate_history(self):
+        """Empty the persisted history (the conversation was cleared or replaced)."""
+        if self._history_fd is not None:
+            os.ftruncate(self._history_fd, 0)
+
+    def _append_history(self, role: str, content: str, persist: bool = True):
+        """Record a message in the conversation history."""
+        history = self.conversation_history
+        if len(history) == history.maxlen:
+            # The oldest message is about to be evicted; keep its gist
+            first = self._history_count - len(history)
+            if first >= self._summary_upto:
+                self._fold_into_summary([history[0]])
+                self._summary_upto = first + 1
+        history.append(Turn(role, content, self._count_tokens(content, role)))
+        if self._history_index is not None:
+            self._history_index.add(self._history_count, content)
+        self._history_count += 1
+        if persist and self._history_fd is not None:
+            os.write(self._history_fd, _dumps_line({"role": role, "content": content}))
+
+    def _fold_into_summary(self, turns: Sequence[Turn]):
+        """Add messages to the rolling summary, keeping its newest part."""
+        summary = summarize_turns(turns)
+        if summary:
+            combined = f"{self._summary} | {summary}" if self._summary else summary
+            self._summary = combined[-SUMMARY_MAX_CHARS:]
+
+    def _reset_summary(self):
+        """Forget the rolling summary (history was cleared or replaced)."""
+        self._summary = ""
+        self._summary_upto = self._history_count
+
+    def _count_tokens(self, text: str, role: str = "") -> int:
+        """Count tokens with tiktoken, or fall back to estimate_tokens."""
+        encoding = _token_encoding(self.llm.model_name if self.llm else "")
+        if encoding is None:
+            return estimate_tokens(role, text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def _relevant_history(self) -> List[Turn]:
+        """Select the past messages most similar to the current one.
+        
+        Each pick is kept together with its user/assistant partner, and the
+        result stays in chronological order with the current message last.
+        """
+        history = self.conversation_history
+        first = self._history_count - len(history)
+        current = self._history_count - 1
+        picked = set()
+        for pos in self._history_index.top_k(first, current, current, self.config.history_retrieval_k):
+            picked.add(pos)
+            partner = pos + 1 if history[pos - first].role == "user" else pos - 1
+            if first <= partner < current:
+                picked.add(partner)
+        return [history[pos - first] for pos in sorted(picked)] + [history[-1]]
+
+    def _history_for_send(self, system: Optional[str] = None):
+        """Return the history to send, trimmed to fit the context window.
+        
+        With history retrieval enabled, only the past messages most relevant
+        to the current one are considered. The result is then trimmed by
+        trim_history to CONTEXT_BUDGET_RATIO of the model's context window,
+        less the system prompt. Token counts are cached on each Turn, so this
+        never re-tokenizes old turns.
+        """
+        window = self.config.get_context_window(self.llm.model_name if self.llm else "")
+        budget = int(CONTEXT_BUDGET_RATIO * window)
+        if system:
+            budget -= self._count_tokens(system, "system")
+        
+        history = self.conversation_history
+        if self._history_index is not None and len(history) - 1 > self.config.history_retrieval_k:
+            return trim_history(self._with_summary(self._relevant_history()), budget)
+        
+        # Messages already folded into the summary are not sent again
+        first = self._history_count - len(history)
+        skip = max(self._summary_upto - first, 0)
+        if skip:
+            history = list(islice(history, skip, None))
+        
+        candidate = self._with_summary(history)
+        trimmed = trim_history(candidate, budget)
+        if trimmed is candidate:
+            return candidate
+        
+        # Summarize what the trim dropped so later requests keep its gist
+        dropped = len(candidate) - len(trimmed)
+        evicted: List[Turn] = []
+        position = first + skip
+        for turn in history:
+            if len(evicted) == dropped:
+                break
+            position += 1
+            if turn.role != "system":
+                evicted.append(turn)
+        self._fold_into_summary(evicted)
+        self._summary_upto = position
+        return self._with_summary([turn for turn in trimmed if not turn.content.startswith(SUMMARY_PREFIX)])
+
+    def _with_summary(self, history: Sequence[Turn]) -> Sequence[Turn]:
+        """Prepend the rolling summary as a system message, if there is one."""
+        if not self._summary:
+            return history
+        summary = SUMMARY_PREFIX + self._summary
+        return [Turn("system", summary, self._count_tokens(summary, "system"))] + list(history)
+
+    def _stream_chat(
+        self,
+        message: str,
+        history,
+        system: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[Sequence[str]] = None
+    ) -> str:
+        """Stream chat response to stdout as tokens arrive."""
+        chunks: List[str] = []
+        buf: List[str] = []
+        nbytes = 0
+        last_flush = time.monotonic()
+        # The spinner only covers the wait for the first token; once output
+        # starts it is torn down so its refresh thread does not contend with writes
+        status = self.console.status("[bold blue]Thinking...", spinner="dots") if self.console else None
+        # Raw tokens go straight to the console's file, bypassing Rich's markup parsing
+        out = self.console.file if self.console else sys.stdout
+        write, flush = out.write, out.flush
+        if status:
+            status.start()
+        waiting = True
+        try:
+            for chunk in self.llm.stream_chat(message, history=history, system=system, max_tokens=max_tokens, stop=stop):
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                buf.append(chunk)
+                nbytes += len(chunk)
+                now = time.monotonic()
+                if waiting:
+                    if status:
+                        status.stop()
+                    waiting = False
+                elif nbytes < STREAM_FLUSH_BYTES and now - last_flush <= STREAM_FLUSH_INTERVAL:
+                    continue
+                write(''.join(buf))
+                flush()
+                buf.clear()
+                nbytes = 0
+                last_flush = now
+            if waiting and status:
+                status.stop()
+            waiting = False
+            buf.append('\n')  # New line after streaming
+            write(''.join(buf))
+            flush()
+            full_response = ''.join(chunks)
+        except Exception as e:
+            if waiting and status:
+                status.stop()
+            self._error(f"Streaming error: {e}")
+            # Fallback to non-streaming
+            full_response = self.llm.chat(message, history=history, system=system, max_tokens=max_tokens, stop=stop)
+            self._print_markdown(full_response)
         
         return full_response
 
-    def analyze_code(self, code_or_file: str) -> str:
+    def analyze_code(self, code_or_file: str, stream: bool = False) -> str:
         """Analyze code for issues and improvements.
         
         Args:
             code_or_file: Code string or file path
+            stream: Stream and display the report as it is generated
             
         Returns:
             Analysis report
         """
-        code = self._get_code(code_or_file)
+        code = self._code_for_analysis(code_or_file)
         if not code:
             return ""
         
-        prompt = f"""Analyze the following code and provide a comprehensive report including:
-1. Code quality issues
-2. Performance problems
-3. Security vulnerabilities
-4. Best practices violations
-5. Refactoring opportunities
-6. Suggestions for improvement
+        return self.chat(
+            _CODE_TMPL.format(code=code), stream=stream, system=_ANALYZE_SYSTEM, cache=True
+        )
+
+    async def analyze_many(self, paths: Sequence[str]) -> Dict[str, Union[str, Exception]]:
+        """Analyze several files concurrently on one event loop.
+        
+        Requests are independent of the conversation history, so they are
+        dispatched together through the provider's async interface, at most
+        ``max_parallel_requests`` at a time.
+        
+        Args:
+            paths: Code file paths
+            
+        Returns:
+            Mapping of path to analysis report, or to the exception raised
+        """
+        import asyncio
+        limit = asyncio.Semaphore(self.config.max_parallel_requests)
+        try:
+            return await self._analyze_files(paths, limit)
+        finally:
+            await self.llm.aclose()
+
+    async def _analyze_files(self, paths: Sequence[str], limit) -> Dict[str, Union[str, Exception]]:
+        """Analyze files one request each (see ``analyze_many``)."""
+        import asyncio
+        
+        async def analyze(path: str) -> str:
+            code = self._code_for_analysis(path)
+            if not code:
+                raise ValueError("no code to analyze")
+            return await self._achat_cached(
+                _CODE_TMPL.format(code=code), _ANALYZE_SYSTEM, self._max_tokens(), limit
+            )
+        
+        results = await asyncio.gather(*(analyze(p) for p in paths), return_exceptions=True)
+        return dict(zip(paths, results))
 
-Code:
-```python
-{code}
-```
+    async def analyze_dir(
+        self,
+        path: str = ".",
+        pattern: str = "**/*.py"
+    ) -> Dict[str, Union[List[str], str, Exception]]:
+        """Analyze a directory, packing small files into shared requests.
+        
+        Files are packed largest first into as few requests as fit half the
+        context window, and each request asks for a JSON report per file.
+        A file too large to share a request is analyzed on its own. Requests
+        run concurrently, as in ``analyze_many``.
+        
+        Args:
+            path: Directory to scan
+            pattern: Glob pattern for files, relative to ``path``
+            
+        Returns:
+            Mapping of file name to its list of issues (packed files), its
+            analysis report (files analyzed alone), or the exception raised
+        """
+        import asyncio
+        root = Path(path)
+        window = self.config.get_context_window(self.llm.model_name)
+        budget = int(BATCH_BUDGET_RATIO * window) * 4
+        
+        sources = []
+        for file in root.glob(pattern):
+            if file.is_file():
+                code = self._code_for_analysis(str(file))
+                if code:
+                    sources.append((file.relative_to(root).as_posix(), code))
+        sources.sort(key=lambda item: len(item[1]), reverse=True)
+        
+        # First-fit decreasing: each file goes into the first batch with room
+        batches: List[List[tuple]] = []
+        sizes: List[int] = []
+        alone: List[str] = []
+        for name, code in sources:
+            size = len(_FILE_TMPL) + len(name) + len(code)
+            if size > budget:
+                alone.append(str(root / name))
+                continue
+            for i, used in enumerate(sizes):
+                if used + size <= budget:
+                    batches[i].append((name, code))
+                    sizes[i] += size
+                    break
+            else:
+                batches.append([(name, code)])
+                sizes.append(size)
+        
+        limit = asyncio.Semaphore(self.config.max_parallel_requests)
+        
+        async def analyze_batch(batch: List[tuple]) -> Dict[str, Union[List[str], Exception]]:
+            message = "".join(_FILE_TMPL.format(name=name, code=code) for name, code in batch)
+            max_tokens = self._max_tokens() or BATCH_MAX_TOKENS
+            try:
+                response = await self._achat_cached(message, _ANALYZE_BATCH_SYSTEM, max_tokens, limit)
+            except Exception as e:
+                return {name: e for name, _ in batch}
+            reports = _parse_file_reports(response)
+            return {
+                name: reports.get(name, ValueError("missing from the batch report"))
+                for name, _ in batch
+            }
+        
+        try:
+            outcomes = await asyncio.gather(
+                self._analyze_files(alone, limit),
+                *(analyze_batch(batch) for batch in batches)
+            )
+        finally:
+            await self.llm.aclose()
+        
+        results: Dict[str, Union[List[str], str, Exception]] = {
+            Path(file).relative_to(root).as_posix(): report for file, report in outcomes[0].items()
+        }
+        for outcome in outcomes[1:]:
+            results.update(outcome)
+        return results
 
-Provide a detailed analysis:"""
+    async def _achat_cached(self, message: str, system: str, max_tokens: Optional[int], limit) -> str:
+        """Send one stateless request through the async API and response cache.
         
-        return self.chat(prompt, stream=False)
+        Args:
+            message: Prompt
+            system: System instructions
+            max_tokens: Reply cap (None for the provider's default)
+            limit: Semaphore bounding concurrent requests
+            
+        Returns:
+            Response text
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(
+                self.llm.provider_name, self.llm.model_name, message, (),
+                system=system, max_tokens=max_tokens
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        async with limit:
+            response = await self.llm.achat(message, system=system, max_tokens=max_tokens)
+        if cache_key and response:
+            self.cache.set(cache_key, response)
+        return response
 
-    def explain_code(self, code_or_file: str) -> str:
+    def explain_code(self, code_or_file: str, stream: bool = False) -> str:
         """Explain code functionality in detail.
         
         Args:
             code_or_file: Code string or file path
+            stream: Stream and display the explanation as it is generated
             
         Returns:
             Explanation
@@ -268,21 +982,9 @@ Provide a detailed analysis:"""
         if not code:
             return ""
         
-        prompt = f"""Explain the following code in detail, including:
-1. What the code does
-2. How it works (step by step)
-3. Key concepts and patterns used
-4. Potential use cases
-5. Any important considerations
-
-Code:
-```python
-{code}
-```
-
-Provide a clear, educational explanation:"""
-        
-        return self.chat(prompt, stream=False)
+        return self.chat(
+            _CODE_TMPL.format(code=code), stream=stream, system=_EXPLAIN_SYSTEM, cache=True
+        )
 
     def generate_code(self, description: str, language: str = "python") -> str:
         """Generate code from a description.
@@ -294,19 +996,12 @@ Provide a clear, educational explanation:"""
         Returns:
             Generated code
         """
-        prompt = f"""Generate {language} code based on the following description:
-{description}
-
-Requirements:
-- Write clean, well-documented code
-- Include type hints if applicable
-- Add comments explaining key parts
-- Follow best practices for {language}
-- Include error handling where appropriate
-
-Provide only the code with brief comments, no explanations outside the code:"""
+        prompt = _GENERATE_TMPL.format(language=language, description=description)
         
-        response = self.chat(prompt, stream=False)
+        response = self.chat(
+            prompt, stream=False, system=_GENERATE_SYSTEM,
+            stop=CODE_STOP, cache=True
+        )
         
         # Extract code block if present
         code = self._extract_code_block(response, language)
@@ -326,18 +1021,13 @@ Provide only the code with brief comments, no explanations outside the code:"""
         if not code:
             return ""
         
-        issue_text = f"\nSpecific issue to fix: {issue}" if issue else ""
+        prompt = _CODE_TMPL.format(code=code)
+        if issue:
+            prompt = _ISSUE_TMPL.format(issue=issue) + prompt
         
-        prompt = f"""Fix the following code, addressing any bugs, errors, or issues.{issue_text}
-
-Code:
-```python
-{code}
-```
-
-Provide the fixed code with explanations of what was changed:"""
-        
-        response = self.chat(prompt, stream=False)
+        response = self.chat(
+            prompt, stream=False, system=_FIX_SYSTEM
+        )
         
         # Extract code block if present
         code = self._extract_code_block(response)
@@ -357,28 +1047,24 @@ Provide the fixed code with explanations of what was changed:"""
         if not code:
             return ""
         
-        goal_text = f"\nRefactoring goal: {goal}" if goal else ""
+        prompt = _CODE_TMPL.format(code=code)
+        if goal:
+            prompt = _GOAL_TMPL.format(goal=goal) + prompt
         
-        prompt = f"""Refactor the following code to improve quality, maintainability, and follow best practices.{goal_text}
-
-Code:
-```python
-{code}
-```
-
-Provide the refactored code with explanations of improvements:"""
-        
-        response = self.chat(prompt, stream=False)
+        response = self.chat(
+            prompt, stream=False, system=_REFACTOR_SYSTEM
+        )
         
         # Extract code block if present
         code = self._extract_code_block(response)
         return code if code else response
 
-    def _get_code(self, code_or_file: str) -> Optional[str]:
+    def _get_code(self, code_or_file: str, budget: Optional[int] = None) -> Optional[str]:
         """Get code from string or file.
         
         Args:
             code_or_file: Code string or file path
+            budget: Bytes of a file to keep, eliding the middle (None for all)
             
         Returns:
             Code content or None if error
@@ -386,8 +1072,22 @@ Provide the refactored code with explanations of improvements:"""
         # Check if it's a file path
         file_path = Path(code_or_file)
         if file_path.exists() and file_path.is_file():
+            key = (file_path, budget)
             try:
-                return file_path.read_text()
+                st = file_path.stat()
+                with self._file_lock:
+                    cached = self._file_cache.get(key)
+                    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                        self._file_cache.move_to_end(key)
+                        return cached[2]
+                
+                text = self._read_source(file_path, st.st_size, budget)
+                with self._file_lock:
+                    self._file_cache[key] = (st.st_mtime_ns, st.st_size, text)
+                    self._file_cache.move_to_end(key)
+                    if len(self._file_cache) > FILE_CACHE_SIZE:
+                        self._file_cache.popitem(last=False)
+                return text
             except Exception as e:
                 self._error(f"Error reading file: {e}")
                 return None
@@ -395,6 +1095,47 @@ Provide the refactored code with explanations of improvements:"""
             # Assume it's code
             return code_or_file
 
+    def _read_source(self, file_path: Path, size: int, budget: Optional[int] = None) -> str:
+        """Read a source file, eliding the middle if it exceeds the budget.
+        
+        Oversized files are never read in full: only the head and tail are
+        fetched from the descriptor.
+        
+        Args:
+            file_path: File to read
+            size: File size in bytes
+            budget: Bytes to keep (None to read the whole file)
+            
+        Returns:
+            Decoded file contents
+        """
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            if budget is None or size <= budget:
+                raw = os.read(fd, size)
+            else:
+                half = budget // 2
+                head = os.read(fd, half)
+                os.lseek(fd, size - half, os.SEEK_SET)
+                tail = os.read(fd, half)
+                raw = head + _ELISION.format(n=size - 2 * half).encode("utf-8") + tail
+        finally:
+            os.close(fd)
+        return raw.decode("utf-8", errors="replace")
+
+    def _code_for_analysis(self, code_or_file: str) -> Optional[str]:
+        """Get code to analyze, without comment-only lines for Python files.
+        
+        Only analysis gets a shortened file: files over the prompt budget keep
+        their head and tail. fix and refactor return whole files, so they
+        always read the full source.
+        """
+        window = self.config.get_context_window(self.llm.model_name if self.llm else "")
+        code = self._get_code(code_or_file, budget=int(SOURCE_BUDGET_RATIO * window) * 4)
+        if code and code_or_file.endswith(".py") and Path(code_or_file).is_file():
+            code = _strip_comment_lines(code)
+        return code
+
     def _extract_code_block(self, text: str, language: str = "python") -> Optional[str]:
         """Extract code block from markdown response.
         
@@ -405,10 +1146,21 @@ Provide the refactored code with explanations of improvements:"""
         Returns:
             Extracted code or None
         """
-        import re
-        # Look for code blocks
-        pattern = rf'```(?:{language}|python)?\n(.*?)```'
-        match = re.search(pattern, text, re.DOTALL)
+        # Fast path: a single fenced block needs no regex
+        start = text.find('```')
+        if start < 0:
+            return None
+        newline = text.find('\n', start)
+        if newline < 0:
+            return None
+        end = text.find('```', newline + 1)
+        if end < 0:
+            return None
+        if text.find('```', end + 3) < 0 and text[start + 3:newline] in ('', language, 'python'):
+            return text[newline + 1:end].strip()
+        
+        # Multiple blocks or another language tag: fall back to the regex
+        match = _code_block_re(language).search(text)
         if match:
             return match.group(1).strip()
         return None
@@ -416,6 +1168,7 @@ Provide the refactored code with explanations of improvements:"""
     def interactive_mode(self):
         """Start interactive chat mode."""
         if self.console:
+            from rich.panel import Panel
             self.console.print(Panel.fit(
                 "[bold cyan]Terminal Agents - AI Coding Assistant[/bold cyan]\n"
                 "[dim]Type 'help' for commands, 'exit' to quit[/dim]",
@@ -429,9 +1182,16 @@ Provide the refactored code with explanations of improvements:"""
         
         self._print_status()
         
+        read_line = input
+        if PROMPT_TOOLKIT_AVAILABLE and sys.stdin.isatty():
+            from prompt_toolkit import PromptSession
+            from prompt_toolkit.history import FileHistory
+            session = PromptSession(history=FileHistory(str(self.config.config_dir / "input_history")))
+            read_line = session.prompt
+        
         while True:
             try:
-                user_input = input("\n👤 You: ").strip()
+                user_input = read_line("\n👤 You: ").strip()
                 
                 if not user_input:
                     continue
@@ -445,7 +1205,9 @@ Provide the refactored code with explanations of improvements:"""
                     continue
                 
                 if user_input.lower() == 'clear':
-                    self.conversation_history = []
+                    self.conversation_history.clear()
+                    self._reset_summary()
+                    self._truncate_history()
                     self._success("Conversation history cleared")
                     continue
                 
@@ -454,6 +1216,11 @@ Provide the refactored code with explanations of improvements:"""
                     self._save_conversation(filename)
                     continue
                 
+                if user_input.lower().startswith('load '):
+                    filename = user_input[5:].strip()
+                    self._load_conversation(filename)
+                    continue
+                
                 # Check for command shortcuts
                 if user_input.startswith('@'):
                     self._handle_command_shortcut(user_input)
@@ -461,12 +1228,7 @@ Provide the refactored code with explanations of improvements:"""
                 
                 # Regular chat
                 self._print("\n🤖 Agent:")
-                response = self.chat(user_input)
-                
-                if self.console:
-                    self.console.print(Markdown(response))
-                else:
-                    print(response)
+                self.chat(user_input)
                     
             except KeyboardInterrupt:
                 self._print("\n\n[cyan]Interrupted. Type 'exit' to quit.[/cyan]")
@@ -481,6 +1243,7 @@ Provide the refactored code with explanations of improvements:"""
         if not self.console:
             return
         
+        from rich.table import Table
         table = Table(title="Status", show_header=False, box=None)
         table.add_row("Provider", f"[green]{self.llm.provider_name if self.llm else 'None'}[/green]")
         table.add_row("Model", f"[cyan]{self.llm.model_name if self.llm else 'None'}[/cyan]")
@@ -497,8 +1260,10 @@ Provide the refactored code with explanations of improvements:"""
   [cyan]@generate <desc>[/cyan]    - Generate code from description
   [cyan]@fix <file>[/cyan]         - Fix code issues
   [cyan]@refactor <file>[/cyan]   - Refactor code
+  [dim]File commands accept glob patterns (e.g. @analyze src/*.py) and run in parallel[/dim]
   [cyan]clear[/cyan]               - Clear conversation history
-  [cyan]save <file>[/cyan]         - Save conversation to file
+  [cyan]save <file>[/cyan]         - Save conversation to file (JSONL)
+  [cyan]load <file>[/cyan]         - Load a saved conversation
   [cyan]help[/cyan]                - Show this help
   [cyan]exit[/cyan]                - Exit interactive mode
 
@@ -508,30 +1273,75 @@ Provide the refactored code with explanations of improvements:"""
   @fix buggy_code.py
         """
         if self.console:
+            from rich.panel import Panel
             self.console.print(Panel(help_text, title="Help", border_style="blue"))
         else:
             print(help_text)
 
+    def _run_isolated(self, func, arg: str) -> str:
+        """Run a code helper in a worker thread without touching shared history."""
+        self._local.isolated = True
+        try:
+            return func(arg)
+        finally:
+            self._local.isolated = False
+
+    def _batch_command(self, cmd: str, pattern: str):
+        """Run a file-based command over every file matching a glob pattern.
+        
+        Requests are fanned out over a shared thread pool and results are
+        shown in completion order.
+        
+        Args:
+            cmd: Shortcut name (analyze, explain, fix or refactor)
+            pattern: Glob pattern relative to the working directory
+        """
+        files = sorted(p for p in self.working_dir.glob(pattern) if p.is_file())
+        if not files:
+            self._error(f"No files match {pattern}")
+            return
+        
+        func, show = {
+            'analyze': (self.analyze_code, 'markdown'),
+            'explain': (self.explain_code, 'markdown'),
+            'fix': (self.fix_code, 'code'),
+            'refactor': (self.refactor_code, 'code'),
+        }[cmd]
+        
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.config.max_parallel_requests)
+        
+        self._print(f"\n🤖 Running {cmd} on {len(files)} files...")
+        futures = {self._pool.submit(self._run_isolated, func, str(f)): f for f in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                self._error(f"{path}: {e}")
+                continue
+            self._print(f"\n[bold]── {path.relative_to(self.working_dir)} ──[/bold]")
+            if show == 'code':
+                self._code_block(result)
+            else:
+                self._print_markdown(result)
+
     def _handle_command_shortcut(self, command: str):
         """Handle command shortcuts in interactive mode."""
         parts = command[1:].split(' ', 1)
         cmd = parts[0].lower()
         arg = parts[1] if len(parts) > 1 else None
         
-        if cmd == 'analyze' and arg:
+        if cmd in ('analyze', 'explain', 'fix', 'refactor') and arg and any(c in arg for c in '*?['):
+            self._batch_command(cmd, arg)
+        elif cmd == 'analyze' and arg:
             self._print("\n🤖 Analyzing code...")
             result = self.analyze_code(arg)
-            if self.console:
-                self.console.print(Markdown(result))
-            else:
-                print(result)
+            self._print_markdown(result)
         elif cmd == 'explain' and arg:
             self._print("\n🤖 Explaining code...")
             result = self.explain_code(arg)
-            if self.console:
-                self.console.print(Markdown(result))
-            else:
-                print(result)
+            self._print_markdown(result)
         elif cmd == 'generate' and arg:
             self._print("\n🤖 Generating code...")
             result = self.generate_code(arg)
@@ -548,18 +1358,57 @@ Provide the refactored code with explanations of improvements:"""
             self._error("Invalid command. Type 'help' for available commands.")
 
     def _save_conversation(self, filename: str):
-        """Save conversation history to file."""
+        """Append unsaved conversation turns to a JSONL transcript.
+        
+        The first save to a file in a session rewrites it; later saves to the
+        same file only append entries added since the previous save.
+        """
         try:
             file_path = Path(filename)
-            data = {
-                "timestamp": datetime.now().isoformat(),
-                "conversation": self.conversation_history
-            }
-            file_path.write_text(json.dumps(data, indent=2))
+            mode = "ab"
+            if file_path != self._saved_path:
+                mode = "wb"
+                self._saved_count = self._history_count - len(self.conversation_history)
+            
+            unsaved = min(self._history_count - self._saved_count, len(self.conversation_history))
+            timestamp = datetime.now()
+            lines = [
+                _dumps_line({**entry.as_message(), "timestamp": timestamp})
+                for entry in list(self.conversation_history)[len(self.conversation_history) - unsaved:]
+            ]
+            with open(file_path, mode) as f:
+                f.write(b"".join(lines))
+            
+            self._saved_path = file_path
+            self._saved_count = self._history_count
             self._success(f"Conversation saved to {filename}")
         except Exception as e:
             self._error(f"Error saving conversation: {e}")
 
+    def _load_conversation(self, filename: str):
+        """Load a JSONL transcript into the conversation history."""
+        try:
+            file_path = Path(filename)
+            entries = []
+            with open(file_path, "rb") as f:
+                if file_path.stat().st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        for line in iter(mm.readline, b""):
+                            if line.strip():
+                                entry = _loads(line)
+                                entries.append(Turn(entry["role"], entry["content"]))
+            
+            self.conversation_history.clear()
+            self._reset_summary()
+            self._truncate_history()
+            for entry in entries:
+                self._append_history(entry.role, entry.content)
+            self._saved_path = file_path
+            self._saved_count = self._history_count
+            self._success(f"Loaded {len(entries)} messages from {filename}")
+        except Exception as e:
+            self._error(f"Error loading conversation: {e}")
+
     def show_help(self):
         """Show help message."""
         help_text = """
@@ -583,6 +1432,7 @@ Provide the refactored code with explanations of improvements:"""
   [yellow]--model <model>[/yellow]       Model name (overrides config)
   [yellow]--provider <name>[/yellow]     Provider name (overrides config)
   [yellow]--config <path>[/yellow]       Path to config file
+  [yellow]--no-cache[/yellow]            Bypass the response cache
 
 [bold]Examples:[/bold]
   python agent.py chat "Explain Python decorators"
@@ -591,24 +1441,76 @@ Provide the refactored code with explanations of improvements:"""
   python agent.py interactive
         """
         if self.console:
+            from rich.panel import Panel
             self.console.print(Panel(help_text, border_style="cyan"))
         else:
             print(help_text)
 
 
+def _analyze_command(agent: TerminalAgent, inputs: List[str]):
+    """Analyze one file (streamed), several files, or a directory."""
+    if len(inputs) == 1 and not Path(inputs[0]).is_dir():
+        agent.analyze_code(inputs[0], stream=True)
+        return
+    
+    import asyncio
+    if len(inputs) > 1:
+        results = asyncio.run(agent.analyze_many(inputs))
+    else:
+        results = asyncio.run(agent.analyze_dir(inputs[0]))
+    for path, result in results.items():
+        if isinstance(result, Exception):
+            agent._error(f"{path}: {result}")
+            continue
+        agent._print(f"\n[bold]── {path} ──[/bold]")
+        if isinstance(result, list):
+            result = "\n".join(f"- {issue}" for issue in result) or "No issues found."
+        agent._print_markdown(result)
+
+
+def _code_command(helper: Callable[[TerminalAgent, str], str], agent: TerminalAgent, inputs: List[str]):
+    """Run a code-producing helper and show its result as a code block."""
+    agent._code_block(helper(agent, " ".join(inputs)))
+
+
+# CLI commands: name -> (handler(agent, inputs), help for the required input or
+# None if the command takes none). Chat, analyze and explain display their own output.
+COMMANDS = {
+    "chat": (lambda agent, inputs: agent.chat(" ".join(inputs)), "Message to send"),
+    "analyze": (_analyze_command, "Code files, or a directory"),
+    "explain": (lambda agent, inputs: agent.explain_code(" ".join(inputs), stream=True), "Code or file path"),
+    "generate": (functools.partial(_code_command, TerminalAgent.generate_code), "Description of the code"),
+    "fix": (functools.partial(_code_command, TerminalAgent.fix_code), "Code or file path"),
+    "refactor": (functools.partial(_code_command, TerminalAgent.refactor_code), "Code or file path"),
+    "interactive": (lambda agent, inputs: agent.interactive_mode(), None),
+    "help": (lambda agent, inputs: agent.show_help(), None),
+}
+
+
+def _add_global_options(parser: argparse.ArgumentParser, default=None):
+    """Add options accepted both before and after the command name."""
+    parser.add_argument("--api-key", default=default, help="API key for LLM provider")
+    parser.add_argument("--model", default=default, help="Model name to use")
+    parser.add_argument("--provider", default=default, help="LLM provider name")
+    parser.add_argument("--config", default=default, help="Path to config file")
+    parser.add_argument("--no-cache", action="store_true", default=default or False, help="Bypass the response cache")
+    parser.add_argument("--max-tokens", type=int, default=default, help="Token cap for every command's reply")
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
         description="Terminal Agents - AI Coding Assistant",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
-    
-    parser.add_argument("command", nargs="?", help="Command to execute")
-    parser.add_argument("input", nargs="*", help="Input for the command")
-    parser.add_argument("--api-key", help="API key for LLM provider")
-    parser.add_argument("--model", help="Model name to use")
-    parser.add_argument("--provider", help="LLM provider name")
-    parser.add_argument("--config", help="Path to config file")
+    _add_global_options(parser)
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    for name, (_, input_help) in COMMANDS.items():
+        # Subcommand copies of the global options only set values actually given
+        sub = subparsers.add_parser(name)
+        _add_global_options(sub, default=argparse.SUPPRESS)
+        if input_help:
+            sub.add_argument("input", nargs="+", help=input_help)
     
     args = parser.parse_args()
     
@@ -617,7 +1519,9 @@ def main():
         api_key=args.api_key,
         model=args.model,
         provider=args.provider,
-        config_path=args.config
+        config_path=args.config,
+        use_cache=False if args.no_cache else None,
+        max_tokens=args.max_tokens
     )
     
     if not agent.llm:
@@ -625,71 +1529,8 @@ def main():
         print("   Please check your configuration and API keys.")
         sys.exit(1)
     
-    # Handle commands
-    if not args.command or args.command == "help":
-        agent.show_help()
-        return
-    
-    command = args.command.lower()
-    input_text = " ".join(args.input) if args.input else ""
-    
-    if command == "chat":
-        if not input_text:
-            agent._error("Please provide a message.")
-            return
-        response = agent.chat(input_text)
-        if agent.console:
-            agent.console.print(Markdown(response))
-        else:
-            print(response)
-    
-    elif command == "analyze":
-        if not input_text:
-            agent._error("Please provide a file path.")
-            return
-        response = agent.analyze_code(input_text)
-        if agent.console:
-            agent.console.print(Markdown(response))
-        else:
-            print(response)
-    
-    elif command == "explain":
-        if not input_text:
-            agent._error("Please provide code or file path.")
-            return
-        response = agent.explain_code(input_text)
-        if agent.console:
-            agent.console.print(Markdown(response))
-        else:
-            print(response)
-    
-    elif command == "generate":
-        if not input_text:
-            agent._error("Please provide a description.")
-            return
-        code = agent.generate_code(input_text)
-        agent._code_block(code)
-    
-    elif command == "fix":
-        if not input_text:
-            agent._error("Please provide code or file path.")
-            return
-        code = agent.fix_code(input_text)
-        agent._code_block(code)
-    
-    elif command == "refactor":
-        if not input_text:
-            agent._error("Please provide a file path.")
-            return
-        code = agent.refactor_code(input_text)
-        agent._code_block(code)
-    
-    elif command == "interactive":
-        agent.interactive_mode()
-    
-    else:
-        agent._error(f"Unknown command: {command}")
-        agent.show_help()
+    handler, _ = COMMANDS[args.command or "help"]
+    handler(agent, getattr(args, "input", []))
 
 
 if __name__ == "__main__":
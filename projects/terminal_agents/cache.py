@@ -0,0 +1,153 @@
+"""
+Response cache for Terminal Agents.
+Two tiers: an in-process LRU and an SQLite database on disk.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+# Use orjson for cache-key encoding when available
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        # NamedTuples (history Turns) encode as plain arrays, as with json
+        return orjson.dumps(obj, default=tuple, option=orjson.OPT_SORT_KEYS)
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True).encode("utf-8")
+
+
+class ResponseCache:
+    """Memory + disk cache of LLM responses keyed on provider, model and prompt."""
+
+    def __init__(self, db_path: Optional[Path] = None, maxsize: int = 256, ttl: float = 0):
+        """Initialize the cache.
+
+        Args:
+            db_path: SQLite file for the disk tier (disabled if None)
+            maxsize: Maximum number of entries kept in memory
+            ttl: Seconds an entry stays valid (0 for no expiry)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                db_path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(hash TEXT PRIMARY KEY, response TEXT NOT NULL, ts INTEGER NOT NULL)"
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: Response cache database unavailable: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        message: str,
+        history: Sequence[tuple] = (),
+        tail: int = 2,
+        system: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[Sequence[str]] = None
+    ) -> str:
+        """Build a cache key from the request and the last few history entries.
+
+        Args:
+            provider: Provider name
+            model: Model name
+            message: Prompt being sent
+            history: Prior conversation (excluding the current message)
+            tail: Number of trailing history entries folded into the key
+            system: System instructions sent with the prompt
+            max_tokens: Reply cap the request was sent with
+            stop: Stop sequences the request was sent with
+
+        Returns:
+            Hex digest key
+        """
+        start = max(len(history) - tail, 0)
+        recent = [history[i] for i in range(start, len(history))]
+        history_hash = hashlib.blake2b(
+            _dumps(recent), digest_size=16
+        ).hexdigest()
+        options = _dumps([max_tokens, list(stop or ())]).decode("utf-8")
+        return hashlib.blake2b(
+            f"{provider}|{model}|{system or ''}|{message}|{history_hash}|{options}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, promoting disk hits into memory."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._fresh(entry[1], now):
+                    self._memory.move_to_end(key)
+                    return entry[0]
+                del self._memory[key]
+
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT response, ts FROM responses WHERE hash = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        if row is None or not self._fresh(row[1], now):
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def set(self, key: str, response: str):
+        """Store a response in both tiers."""
+        now = time.time()
+        self._remember(key, response, now)
+        if self._db is not None:
+            with self._lock:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (hash, response, ts) VALUES (?, ?, ?)",
+                        (key, response, int(now))
+                    )
+                except sqlite3.Error:
+                    pass
+
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _fresh(self, ts: float, now: float) -> bool:
+        return not self.ttl or now - ts < self.ttl
+
+    def _remember(self, key: str, response: str, ts: float):
+        with self._lock:
+            self._memory[key] = (response, ts)
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
@@ -4,34 +4,76 @@ Handles environment variables, API keys, and system configuration.
 Supports multiple LLM providers with priority on free/open-source options.
 """
 
+import json
 import os
 import socket
+import time
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any
-import yaml
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, Mapping
+
+
+# Context window sizes in tokens, matched by model-name prefix (longest wins)
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16_385,
+    "gpt-4": 8_192,
+    "gpt-4-turbo": 128_000,
+    "gpt-4o": 128_000,
+    "claude-3": 200_000,
+    "llama3": 8_192,
+    "llama3.1": 128_000,
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+
+# Ollama liveness probe: connect timeout, and how long a successful probe is reused across runs
+OLLAMA_PROBE_TIMEOUT = 0.2
+OLLAMA_PROBE_TTL = 60
+
+
+@lru_cache(maxsize=8)
+def _load_config_file(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse a config file; cached per path and modification time.
+    
+    JSON files skip YAML entirely, and YAML uses libyaml's C loader when
+    PyYAML was built with it.
+    """
+    if path.endswith(".json"):
+        with open(path, "rb") as f:
+            return json.load(f) or {}
+    
+    import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=SafeLoader) or {}
 
 
 class TerminalAgentConfig:
     """Configuration class for Terminal Agents with multi-provider LLM support."""
 
-    def __init__(self, config_path: Optional[str] = None):
+    def __init__(self, config_path: Optional[str] = None, env: Optional[Mapping[str, str]] = None):
         """Initialize configuration.
         
         Args:
-            config_path: Path to YAML config file (optional)
+            config_path: Path to YAML or JSON config file (optional)
+            env: Environment to read settings from (defaults to os.environ)
         """
+        self._env: Mapping[str, str] = os.environ if env is None else env
+
         # Load config file if provided
         config_data = {}
         if config_path and Path(config_path).exists():
             try:
-                with open(config_path, 'r') as f:
-                    config_data = yaml.safe_load(f) or {}
+                config_data = dict(_load_config_file(str(config_path), os.stat(config_path).st_mtime_ns))
             except Exception as e:
                 print(f"Warning: Could not load config file: {e}")
         
         # Helper to get value from config file or environment
         def get_config(key: str, env_key: str, default: Any = "") -> str:
-            return str(config_data.get(key, os.getenv(env_key, default)))
+            return str(config_data.get(key, self._env.get(env_key, default)))
         
         # ==================== Provider Selection ====================
         # Priority order: free/open-source first, then paid
@@ -40,6 +82,12 @@ class TerminalAgentConfig:
         
         # ==================== Ollama (Free/Local) ====================
         self.ollama_base_url: str = get_config("ollama_base_url", "OLLAMA_BASE_URL", "http://localhost:11434")
+        parsed = urlparse(self.ollama_base_url if "//" in self.ollama_base_url else f"http://{self.ollama_base_url}")
+        self._ollama_host: str = parsed.hostname or "localhost"
+        try:
+            self._ollama_port: int = parsed.port or 11434
+        except ValueError:
+            self._ollama_port = 11434
         self.ollama_model: str = get_config("ollama_model", "OLLAMA_MODEL", "llama3.1:8b")
         
         # ==================== OpenAI (Paid) ====================
@@ -65,15 +113,45 @@ class TerminalAgentConfig:
         self.api_key: Optional[str] = get_config("api_key", "TERMINAL_AGENTS_API_KEY", "")
         self.model: Optional[str] = get_config("model", "TERMINAL_AGENTS_MODEL", "")
         
+        # Conversation settings (one turn is a user message plus the reply)
+        self.history_max_turns: int = int(get_config("history_max_turns", "TERMINAL_AGENTS_HISTORY_MAX_TURNS", 32))
+        # 0 = look the window up from MODEL_CONTEXT_WINDOWS by model name
+        self.context_window: int = int(get_config("context_window", "TERMINAL_AGENTS_CONTEXT_WINDOW", 0))
+        
+        # Semantic history retrieval: send only the k most relevant past messages (0 disables)
+        self.history_retrieval_k: int = int(get_config("history_retrieval_k", "TERMINAL_AGENTS_HISTORY_RETRIEVAL_K", 0))
+        self.embedding_model: str = get_config("embedding_model", "TERMINAL_AGENTS_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        
+        # Per-request read timeout in seconds (between chunks when streaming)
+        self.request_timeout: float = float(get_config("request_timeout", "TERMINAL_AGENTS_REQUEST_TIMEOUT", 60))
+        
+        # Maximum concurrent LLM requests for multi-file commands
+        self.max_parallel_requests: int = int(get_config("max_parallel_requests", "TERMINAL_AGENTS_MAX_PARALLEL", 8))
+        
+        # Token cap for every reply; 0 = no cap (the provider's default)
+        self.max_tokens: int = int(get_config("max_tokens", "TERMINAL_AGENTS_MAX_TOKENS", 0))
+        
         # Output settings
-        self.verbose: bool = os.getenv("VERBOSE", "true").lower() == "true"
+        self.verbose: bool = self._env.get("VERBOSE", "true").lower() == "true"
         
         # Config directory
         self.config_dir = Path.home() / ".terminal_agents"
         self.config_dir.mkdir(exist_ok=True)
         
         # History file
-        self.history_file = self.config_dir / "history.json"
+        self.history_file = self.config_dir / "history.jsonl"
+        # Keep the conversation in history_file across runs (append-only JSONL)
+        self.persist_history: bool = get_config("persist_history", "TERMINAL_AGENTS_PERSIST_HISTORY", "false").lower() == "true"
+        
+        # Last successful Ollama probe, shared between CLI runs
+        self.provider_cache_file = self.config_dir / "provider_cache.json"
+        
+        # Response cache for stateless commands (memory LRU + SQLite at config_dir/cache.db;
+        # chat is never cached). TTL in seconds, 0 = never expire
+        self.cache_enabled: bool = get_config("cache_enabled", "TERMINAL_AGENTS_CACHE", "true").lower() == "true"
+        self.cache_size: int = int(get_config("cache_size", "TERMINAL_AGENTS_CACHE_SIZE", 256))
+        self.cache_ttl: float = float(get_config("cache_ttl", "TERMINAL_AGENTS_CACHE_TTL", 24 * 3600))
+        self.cache_path = self.config_dir / "cache.db"
 
     def detect_best_provider(self) -> Optional[str]:
         """Auto-detect the best available LLM provider.
@@ -87,7 +165,7 @@ class TerminalAgentConfig:
         
         # Priority order: free first, then paid
         # 1. Check Ollama (free, local)
-        if self._check_ollama_available():
+        if self._check_ollama_available:
             return "ollama"
         
         # 2. Check OpenAI
@@ -108,24 +186,51 @@ class TerminalAgentConfig:
         
         return None
 
+    @cached_property
     def _check_ollama_available(self) -> bool:
-        """Check if Ollama is running locally."""
+        """Check if Ollama is running locally (probed at most once per process).
+        
+        Set OLLAMA_SKIP_PROBE=1 to skip the check entirely.
+        """
+        if self._env.get("OLLAMA_SKIP_PROBE", "").lower() in ("1", "true"):
+            return False
+        
+        endpoint = f"{self._ollama_host}:{self._ollama_port}"
         try:
-            url_parts = self.ollama_base_url.replace("http://", "").replace("https://", "")
-            if ":" in url_parts:
-                host, port = url_parts.split(":")
-                port = int(port)
-            else:
-                host = url_parts
-                port = 11434
-            
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(2)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
-        except Exception:
+            cached = json.loads(self.provider_cache_file.read_text())
+            if cached.get("ollama") == endpoint and time.time() - cached.get("ts", 0) < OLLAMA_PROBE_TTL:
+                return True
+        except (OSError, ValueError, AttributeError):
+            pass
+        
+        try:
+            with socket.create_connection((self._ollama_host, self._ollama_port), timeout=OLLAMA_PROBE_TIMEOUT):
+                pass
+        except OSError:
             return False
+        
+        try:
+            self.provider_cache_file.write_text(json.dumps({"ollama": endpoint, "ts": time.time()}))
+        except OSError:
+            pass
+        return True
+
+    def get_context_window(self, model: str) -> int:
+        """Get the context window size for a model.
+        
+        Args:
+            model: Model name
+            
+        Returns:
+            Configured window, else the longest matching prefix in
+            MODEL_CONTEXT_WINDOWS, else DEFAULT_CONTEXT_WINDOW
+        """
+        if self.context_window > 0:
+            return self.context_window
+        matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+        if not matches:
+            return DEFAULT_CONTEXT_WINDOW
+        return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
 
     def get_provider_config(self, provider: str) -> Dict[str, Any]:
         """Get configuration for a specific provider.
@@ -136,30 +241,36 @@ class TerminalAgentConfig:
         Returns:
             Configuration dictionary
         """
-        configs = {
-            "ollama": {
+        # Built on demand: only the requested provider's settings, read at call
+        # time so overrides applied after __init__ (api_key, model) are honored
+        if provider == "ollama":
+            return {
                 "base_url": self.ollama_base_url,
                 "model": self.ollama_model,
-            },
-            "openai": {
+            }
+        if provider == "openai":
+            return {
                 "api_key": self.openai_api_key or self.api_key,
                 "api_base": self.openai_api_base,
                 "model": self.openai_model or self.model,
-            },
-            "anthropic": {
+                "timeout": self.request_timeout,
+            }
+        if provider == "anthropic":
+            return {
                 "api_key": self.anthropic_api_key or self.api_key,
                 "model": self.anthropic_model or self.model,
-            },
-            "google": {
+            }
+        if provider == "google":
+            return {
                 "api_key": self.google_api_key or self.api_key,
                 "model": self.google_model or self.model,
-            },
-            "azure": {
+            }
+        if provider == "azure":
+            return {
                 "api_key": self.azure_openai_api_key or self.api_key,
                 "endpoint": self.azure_openai_endpoint,
                 "deployment": self.azure_openai_deployment,
                 "api_version": self.azure_openai_api_version,
-            },
-        }
-        return configs.get(provider, {})
+            }
+        return {}
 
@@ -0,0 +1,62 @@
+"""
+Semantic index over conversation history for Terminal Agents.
+Embeds each message once and retrieves the most relevant past messages
+with a single matrix-vector product.
+"""
+
+from typing import List
+
+
+class HistoryIndex:
+    """Fixed-capacity embedding matrix addressed by absolute message position.
+
+    Rows are reused as a ring buffer, so the matrix stays aligned with a
+    bounded deque of the same capacity: the message at absolute position
+    ``p`` lives in row ``p % capacity``.
+    """
+
+    def __init__(self, capacity: int, model_name: str):
+        """Initialize the index.
+
+        Args:
+            capacity: Number of messages kept (the history deque's maxlen)
+            model_name: sentence-transformers model used for embeddings
+
+        Raises:
+            ImportError: If numpy or sentence-transformers is not installed
+        """
+        import numpy as np
+        from sentence_transformers import SentenceTransformer
+
+        self._np = np
+        self.model = SentenceTransformer(model_name)
+        self.capacity = capacity
+        dim = self.model.get_sentence_embedding_dimension()
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+
+    def add(self, position: int, text: str):
+        """Embed a message and store it at its absolute position."""
+        self.matrix[position % self.capacity] = self.model.encode(
+            text, normalize_embeddings=True, convert_to_numpy=True
+        )
+
+    def top_k(self, first: int, last: int, query: int, k: int) -> List[int]:
+        """Return the k positions in [first, last) most similar to ``query``.
+
+        Args:
+            first: Oldest absolute position still held
+            last: Position one past the last candidate
+            query: Absolute position of the query message
+            k: Number of positions to return
+
+        Returns:
+            Selected absolute positions in chronological order
+        """
+        np = self._np
+        positions = np.arange(first, last)
+        if k >= len(positions):
+            return positions.tolist()
+        # Embeddings are unit-normalized, so the dot product is cosine similarity
+        sims = self.matrix[positions % self.capacity] @ self.matrix[query % self.capacity]
+        picked = np.argpartition(-sims, k)[:k]
+        return np.sort(positions[picked]).tolist()
@@ -3,10 +3,149 @@ LLM Provider System for Terminal Agents.
 Supports multiple LLM providers with a unified interface.
 """
 
+import atexit
+import hashlib
+import importlib.util
+import json
 import os
-from typing import Optional, List, Dict, Any, Iterator
+import sys
+from functools import lru_cache
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List, NamedTuple, Sequence, Tuple, Union
 from abc import ABC, abstractmethod
 
+from config import TerminalAgentConfig
+
+# Use orjson for request bodies and stream events when available
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True).encode("utf-8")
+
+    _loads = json.loads
+
+# httpx is optional; it backs the shared connection pool and the native async
+# OpenAI client, and is imported only when a client is first built
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Keep-alive connections shared by every client built below
+HTTP_POOL_LIMITS = 32
+
+
+@lru_cache(maxsize=1)
+def _shared_http_client():
+    """Return the process-wide pooled httpx.Client, or None without httpx.
+    
+    Every OpenAI and Anthropic client is built on this one connection pool,
+    which is closed at interpreter exit.
+    """
+    if not HTTPX_AVAILABLE:
+        return None
+    import httpx
+    client = httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_keepalive_connections=HTTP_POOL_LIMITS)
+    )
+    atexit.register(client.close)
+    return client
+
+
+@lru_cache(maxsize=8)
+def _get_openai_client(api_key: Optional[str], base_url: Optional[str]):
+    """Return a process-wide OpenAI client, so agents reuse warm TLS connections."""
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=_shared_http_client())
+
+
+@lru_cache(maxsize=8)
+def _get_anthropic_client(api_key: Optional[str]):
+    """Return a process-wide Anthropic client, so agents reuse warm TLS connections."""
+    from anthropic import Anthropic
+    return Anthropic(api_key=api_key, http_client=_shared_http_client())
+
+
+class Turn(NamedTuple):
+    """One conversation message, with its token count cached when known."""
+    role: str
+    content: str
+    tokens: int = -1
+
+    def as_message(self) -> Dict[str, str]:
+        """Chat-API message dict for this turn."""
+        return {"role": self.role, "content": self.content}
+
+
+def _normalize_messages(history: Optional[Sequence[Union[Turn, Dict[str, str]]]], message: str) -> Tuple[Turn, ...]:
+    """Return the conversation to send, ending with the current user message.
+
+    Earlier turns are passed through unchanged and in order, so consecutive
+    requests share a byte-identical prefix that providers can serve from
+    their prompt cache. The current message is appended only if the history
+    does not already end with it. Plain ``{"role", "content"}`` dicts are
+    converted to Turns.
+    """
+    turns = tuple(
+        Turn(entry["role"], entry["content"]) if isinstance(entry, dict) else entry
+        for entry in history or ()
+    )
+    if turns and turns[-1].role == "user" and turns[-1].content == message:
+        return turns
+    return turns + (Turn("user", message),)
+
+
+# Set TERMINAL_AGENTS_DEBUG_PREFIX=1 to log a hash of each request's prefix
+# (everything before the current message); it should only change when history does
+DEBUG_PREFIX = os.getenv("TERMINAL_AGENTS_DEBUG_PREFIX", "").lower() in ("1", "true")
+
+
+def _log_prefix(provider_name: str, prefix: Any):
+    """Print the sha256 of a request prefix to stderr when prefix debugging is on."""
+    if DEBUG_PREFIX:
+        digest = hashlib.sha256(_dumps(prefix)).hexdigest()
+        print(f"[{provider_name}] prefix sha256={digest[:16]}", file=sys.stderr)
+
+
+# Anthropic requires max_tokens; used when the caller sets no budget
+ANTHROPIC_MAX_TOKENS = 4096
+
+
+def _openai_options(max_tokens: Optional[int], stop: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Chat-completions generation limits, omitting unset values."""
+    options: Dict[str, Any] = {}
+    if max_tokens:
+        options["max_tokens"] = max_tokens
+    if stop:
+        options["stop"] = list(stop)
+    return options
+
+
+def _openai_stop(finish_reason: Optional[str], stop: Optional[Sequence[str]]) -> Optional[str]:
+    """The stop sequence that ended a chat completion, if it can be told apart.
+    
+    "stop" covers both a natural end and a stop sequence, so this is only
+    definite when a single sequence was sent.
+    """
+    if finish_reason == "stop" and stop and len(stop) == 1:
+        return stop[0]
+    return None
+
+
+def _ollama_options(max_tokens: Optional[int], stop: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Ollama generation limits (num_predict caps generated tokens)."""
+    options: Dict[str, Any] = {}
+    if max_tokens:
+        options["num_predict"] = max_tokens
+    if stop:
+        options["stop"] = list(stop)
+    return options
+
 
 class LLMProvider(ABC):
     """Base class for LLM providers."""
@@ -17,14 +156,19 @@ class LLMProvider(ABC):
         self.provider_name = "Unknown"
         self.model_name = "Unknown"
         self.supports_streaming = False
+        # Stop sequence that ended the last chat() reply, when the API says so
+        self.last_stop: Optional[str] = None
     
     @abstractmethod
-    def chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
+    def chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
         """Send a chat message and get response.
         
         Args:
             message: User message
             history: Conversation history
+            system: Static system instructions, sent ahead of the history
+            max_tokens: Cap on generated tokens (provider default if None)
+            stop: Sequences that end generation early
             
         Returns:
             Response text
@@ -32,17 +176,38 @@ class LLMProvider(ABC):
         pass
     
     @abstractmethod
-    def stream_chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Iterator[str]:
+    def stream_chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> Iterator[str]:
         """Stream chat response.
         
         Args:
             message: User message
             history: Conversation history
+            system: Static system instructions, sent ahead of the history
+            max_tokens: Cap on generated tokens (provider default if None)
+            stop: Sequences that end generation early
             
         Yields:
             Response chunks
         """
         pass
+    
+    async def achat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
+        """Send a chat message without blocking the event loop.
+        
+        The default runs ``chat`` in a worker thread; providers with a native
+        async client override this.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.chat, message, history, system, max_tokens, stop)
+    
+    async def astream_chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> AsyncIterator[str]:
+        """Stream chat response asynchronously (default: one chunk from achat)."""
+        yield await self.achat(message, history, system, max_tokens, stop)
+    
+    async def aclose(self):
+        """Release async resources; the async client is recreated on next use."""
+        pass
 
 
 class OpenAIProvider(LLMProvider):
@@ -51,61 +216,143 @@ class OpenAIProvider(LLMProvider):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         try:
-            from openai import OpenAI
-            self.client = OpenAI(
-                api_key=config.get("api_key"),
-                base_url=config.get("api_base") or None
-            )
+            self.client = _get_openai_client(config.get("api_key"), config.get("api_base") or None)
             self.provider_name = "OpenAI"
             self.model_name = config.get("model", "gpt-4o-mini")
             self.supports_streaming = True
+            # Read timeout, which for streams bounds the wait between chunks
+            self.timeout = float(config.get("timeout", 60))
+            self.last_usage = None
+            self.api_key = config.get("api_key")
+            self.base_url = (config.get("api_base") or "https://api.openai.com/v1").rstrip("/")
+            self._async_client = None
         except ImportError:
             raise ImportError("openai package not installed. Install with: pip install openai")
         except Exception as e:
             raise Exception(f"Failed to initialize OpenAI: {e}")
     
-    def chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
+    def chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
         """Send chat message."""
-        messages = []
-        
-        # Add history if provided
-        if history:
-            messages.extend(history[:-1])  # All but last user message
-        
-        # Add current message
-        messages.append({"role": "user", "content": message})
+        messages = self._build_messages(message, history, system)
         
         try:
             response = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
-                temperature=0.7
+                temperature=0.7,
+                timeout=self.timeout,
+                **_openai_options(max_tokens, stop)
             )
+            self.last_usage = response.usage
+            self.last_stop = _openai_stop(response.choices[0].finish_reason, stop)
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"OpenAI API error: {e}")
     
-    def stream_chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Iterator[str]:
+    def stream_chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> Iterator[str]:
         """Stream chat response."""
-        messages = []
-        
-        if history:
-            messages.extend(history[:-1])
-        
-        messages.append({"role": "user", "content": message})
+        messages = self._build_messages(message, history, system)
         
         try:
             stream = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
                 temperature=0.7,
-                stream=True
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=self.timeout,
+                **_openai_options(max_tokens, stop)
             )
             for chunk in stream:
+                # The final usage chunk carries no choices
+                if not chunk.choices:
+                    self.last_usage = chunk.usage
+                    continue
                 if chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
         except Exception as e:
             raise Exception(f"OpenAI streaming error: {e}")
+    
+    def _build_messages(
+        self,
+        message: str,
+        history: Optional[Sequence[Turn]],
+        system: Optional[str]
+    ) -> List[Dict[str, str]]:
+        """Build the chat-completions message list."""
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.extend(turn.as_message() for turn in _normalize_messages(history, message))
+        _log_prefix(self.provider_name, messages[:-1])
+        return messages
+    
+    def _get_async_client(self):
+        """Shared httpx.AsyncClient, so concurrent requests reuse pooled connections."""
+        if not HTTPX_AVAILABLE:
+            raise ImportError("httpx not installed. Install with: pip install httpx")
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Bodies are pre-encoded with _dumps, so the content type is set here
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+                timeout=self.timeout,
+                http2=HTTP2_AVAILABLE
+            )
+        return self._async_client
+    
+    async def achat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
+        """Send chat message over the shared async HTTP client."""
+        payload = {
+            "model": self.model_name,
+            "messages": self._build_messages(message, history, system),
+            "temperature": 0.7,
+            **_openai_options(max_tokens, stop),
+        }
+        try:
+            response = await self._get_async_client().post("/chat/completions", content=_dumps(payload))
+            response.raise_for_status()
+            data = response.json()
+            self.last_usage = data.get("usage")
+            self.last_stop = _openai_stop(data["choices"][0].get("finish_reason"), stop)
+            return data["choices"][0]["message"]["content"]
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {e}")
+    
+    async def astream_chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> AsyncIterator[str]:
+        """Stream chat response by parsing server-sent events."""
+        payload = {
+            "model": self.model_name,
+            "messages": self._build_messages(message, history, system),
+            "temperature": 0.7,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            **_openai_options(max_tokens, stop),
+        }
+        try:
+            async with self._get_async_client().stream("POST", "/chat/completions", content=_dumps(payload)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = _loads(data)
+                    choices = chunk.get("choices")
+                    if not choices:
+                        self.last_usage = chunk.get("usage")
+                        continue
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+        except Exception as e:
+            raise Exception(f"OpenAI streaming error: {e}")
+    
+    async def aclose(self):
+        """Close the async HTTP client."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
 
 
 class AnthropicProvider(LLMProvider):
@@ -114,8 +361,7 @@ class AnthropicProvider(LLMProvider):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         try:
-            from anthropic import Anthropic
-            self.client = Anthropic(api_key=config.get("api_key"))
+            self.client = _get_anthropic_client(config.get("api_key"))
             self.provider_name = "Anthropic"
             self.model_name = config.get("model", "claude-3-5-sonnet-20241022")
             self.supports_streaming = True
@@ -124,60 +370,76 @@ class AnthropicProvider(LLMProvider):
         except Exception as e:
             raise Exception(f"Failed to initialize Anthropic: {e}")
     
-    def chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
-        """Send chat message."""
-        # Anthropic uses different message format
-        system_message = ""
-        messages = []
+    def _build_request(
+        self,
+        message: str,
+        history: Optional[Sequence[Turn]],
+        system: Optional[str],
+        max_tokens: Optional[int],
+        stop: Optional[Sequence[str]]
+    ) -> Dict[str, Any]:
+        """Build keyword arguments for messages.create / messages.stream.
         
-        if history:
-            # Convert history to Anthropic format
-            for msg in history[:-1]:
-                if msg["role"] == "assistant":
-                    messages.append({"role": "assistant", "content": msg["content"]})
-                elif msg["role"] == "user":
-                    messages.append({"role": "user", "content": msg["content"]})
+        Anthropic takes system text as a separate parameter, so system turns
+        in the history (e.g. a conversation summary) are appended to it after
+        the static instructions. Cache breakpoints mark the static system
+        prompt and the latest user message, so the next request can reuse
+        everything up to them from the prompt cache.
+        """
+        system_blocks = []
+        if system:
+            system_blocks.append({"type": "text", "text": system, "cache_control": {"type": "ephemeral"}})
+        messages = []
+        for turn in _normalize_messages(history, message):
+            if turn.role == "system":
+                system_blocks.append({"type": "text", "text": turn.content})
+            elif turn.role in ("assistant", "user"):
+                messages.append(turn.as_message())
+        _log_prefix(self.provider_name, [system_blocks, messages[:-1]])
+        messages[-1] = {
+            "role": "user",
+            "content": [{"type": "text", "text": message, "cache_control": {"type": "ephemeral"}}]
+        }
         
-        messages.append({"role": "user", "content": message})
+        request: Dict[str, Any] = {
+            "model": self.model_name,
+            "max_tokens": max_tokens or ANTHROPIC_MAX_TOKENS,
+            "messages": messages,
+        }
+        if system_blocks:
+            request["system"] = system_blocks
+        if stop:
+            request["stop_sequences"] = list(stop)
+        return request
+    
+    def chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
+        """Send chat message."""
+        request = self._build_request(message, history, system, max_tokens, stop)
         
         try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=4096,
-                system=system_message,
-                messages=messages
-            )
+            response = self.client.messages.create(**request)
+            self.last_stop = response.stop_sequence if response.stop_reason == "stop_sequence" else None
             return response.content[0].text
         except Exception as e:
             raise Exception(f"Anthropic API error: {e}")
     
-    def stream_chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Iterator[str]:
+    def stream_chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> Iterator[str]:
         """Stream chat response."""
-        system_message = ""
-        messages = []
-        
-        if history:
-            for msg in history[:-1]:
-                if msg["role"] == "assistant":
-                    messages.append({"role": "assistant", "content": msg["content"]})
-                elif msg["role"] == "user":
-                    messages.append({"role": "user", "content": msg["content"]})
-        
-        messages.append({"role": "user", "content": message})
+        request = self._build_request(message, history, system, max_tokens, stop)
         
         try:
-            with self.client.messages.stream(
-                model=self.model_name,
-                max_tokens=4096,
-                system=system_message,
-                messages=messages
-            ) as stream:
+            with self.client.messages.stream(**request) as stream:
                 for text in stream.text_stream:
-                    yield text
+                    if text:
+                        yield text
         except Exception as e:
             raise Exception(f"Anthropic streaming error: {e}")
 
 
+# Speaker labels in the plain-text Ollama prompt
+_OLLAMA_ROLES = {"user": "User", "system": "System"}
+
+
 class OllamaProvider(LLMProvider):
     """Ollama provider (free, local)."""
     
@@ -193,45 +455,69 @@ class OllamaProvider(LLMProvider):
             self.provider_name = "Ollama"
             self.model_name = config.get("model", "llama3.1:8b")
             self.supports_streaming = True
+            # Rendered prompt for the last (system, prior turns) sent, extended in place
+            self._prompt_key: Tuple[Optional[str], Tuple[Turn, ...]] = (None, ())
+            self._prompt_prefix = ""
         except ImportError:
             raise ImportError("langchain-community not installed. Install with: pip install langchain-community")
         except Exception as e:
             raise Exception(f"Failed to initialize Ollama: {e}")
     
-    def chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
+    def chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
         """Send chat message."""
         # Build prompt from history
-        prompt = self._build_prompt(message, history)
+        prompt = self._build_prompt(message, history, system)
         try:
-            response = self.llm.invoke(prompt)
+            response = self.llm.invoke(prompt, **_ollama_options(max_tokens, stop))
+            # The LangChain wrapper does not say why generation ended; with no
+            # token cap, an early end can only come from the stop sequence
+            self.last_stop = stop[0] if stop and len(stop) == 1 and not max_tokens else None
             return str(response)
         except Exception as e:
             raise Exception(f"Ollama error: {e}")
     
-    def stream_chat(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Iterator[str]:
+    def stream_chat(self, message: str, history: Optional[Sequence[Turn]] = None, system: Optional[str] = None, max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> Iterator[str]:
         """Stream chat response."""
-        prompt = self._build_prompt(message, history)
+        prompt = self._build_prompt(message, history, system)
         try:
-            for chunk in self.llm.stream(prompt):
-                yield str(chunk)
+            for chunk in self.llm.stream(prompt, **_ollama_options(max_tokens, stop)):
+                # Ollama emits empty chunks (e.g. the final done message)
+                if chunk:
+                    yield str(chunk)
         except Exception as e:
             raise Exception(f"Ollama streaming error: {e}")
     
-    def _build_prompt(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
-        """Build prompt from message and history."""
-        if not history:
-            return message
+    def _build_prompt(
+        self,
+        message: str,
+        history: Optional[Sequence[Turn]] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """Build prompt from message and history.
         
-        # Simple prompt building for Ollama
-        prompt_parts = []
-        for msg in history:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            prompt_parts.append(f"{role}: {msg['content']}")
+        The rendered text of earlier turns is kept between calls, so while the
+        conversation only grows, just the newest turns are formatted. Any other
+        change (trimming, a new summary, another system prompt) re-renders it.
+        """
+        if not history:
+            return f"{system}\n\n{message}" if system else message
         
-        prompt_parts.append(f"User: {message}")
-        prompt_parts.append("Assistant:")
+        prior = _normalize_messages(history, message)[:-1]
+        cached_system, cached_turns = self._prompt_key
+        if cached_system == system and prior[:len(cached_turns)] == cached_turns:
+            prefix = self._prompt_prefix
+            new_turns = prior[len(cached_turns):]
+        else:
+            prefix = f"{system}\n\n" if system else ""
+            new_turns = prior
+        if new_turns:
+            prefix += "".join(
+                f"{_OLLAMA_ROLES.get(msg.role, 'Assistant')}: {msg.content}\n\n" for msg in new_turns
+            )
+        self._prompt_key = (system, prior)
+        self._prompt_prefix = prefix
         
-        return "\n\n".join(prompt_parts)
+        return f"{prefix}User: {message}\n\nAssistant:"
 
 
 def get_llm_provider(
@@ -252,7 +538,6 @@ def get_llm_provider(
         Initialized LLMProvider or None
     """
     if not config:
-        from config import TerminalAgentConfig
         config = TerminalAgentConfig()
     
     # Determine provider
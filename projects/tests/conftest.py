@@ -3,45 +3,174 @@ Pytest configuration and shared fixtures for all tests.
 """
 
 import pytest
+import importlib
 import os
 import sys
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
-import tempfile
-import shutil
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 
 # Add project directories to path
 PROJECTS_DIR = Path(__file__).parent.parent
-sys.path.insert(0, str(PROJECTS_DIR))
+if os.fspath(PROJECTS_DIR) not in sys.path:
+    sys.path.insert(0, os.fspath(PROJECTS_DIR))
 
 # Test data directory
 TEST_DATA_DIR = Path(__file__).parent / "test_data"
 TEST_DATA_DIR.mkdir(exist_ok=True)
 
 
+@contextmanager
+def project_imports(project):
+    """Make a project's top-level modules importable for the duration of the block.
+    
+    Projects reuse module names (``app``, ``config``), so same-named modules
+    imported from elsewhere are hidden inside the block, and whatever the
+    block imports from the project directory is dropped again on exit.
+    """
+    project_dir = os.fspath(PROJECTS_DIR / project)
+    with os.scandir(project_dir) as entries:
+        names = {os.path.splitext(entry.name)[0] for entry in entries}
+    hidden = {name: sys.modules.pop(name) for name in names if name in sys.modules}
+    sys.path.insert(0, project_dir)
+    loaded = set(sys.modules)
+    try:
+        yield
+    finally:
+        sys.path.remove(project_dir)
+        for name in set(sys.modules) - loaded:
+            module_file = getattr(sys.modules[name], "__file__", None) or ""
+            if module_file.startswith(project_dir + os.sep):
+                del sys.modules[name]
+        sys.modules.update(hidden)
+
+
+@lru_cache(maxsize=None)
+def _load_project_module(project, module):
+    """Import a project module once, or return None if its dependencies are missing.
+    
+    Failed imports are never added to ``sys.modules``, so caching here also
+    keeps a missing dependency from being searched for again by every test.
+    """
+    with project_imports(project):
+        try:
+            return importlib.import_module(module)
+        except ImportError:
+            return None
+
+
+@pytest.fixture(scope="session")
+def crewai_config():
+    """Crewai's ``config`` module (None if unavailable)."""
+    return _load_project_module("Crewai", "config")
+
+
+@pytest.fixture(scope="session")
+def crewai_import():
+    """Cached importer for Crewai modules (``crews``, ``tools.ml_tools``, ...)."""
+    return partial(_load_project_module, "Crewai")
+
+
+@pytest.fixture(scope="session")
+def ios_app():
+    """ios_chatbot's Flask ``app`` module (None if unavailable)."""
+    return _load_project_module("ios_chatbot", "app")
+
+
+@pytest.fixture(scope="session")
+def litellm_proxy():
+    """litellm's ``proxy_server`` module (None if unavailable)."""
+    return _load_project_module("litellm", "proxy_server")
+
+
+@pytest.fixture(scope="session")
+def psychometrics_app():
+    """Psychometrics' Streamlit ``app`` module (None if unavailable)."""
+    return _load_project_module("Psychometrics", "app")
+
+
+@pytest.fixture(scope="session")
+def rag_app():
+    """RAG_Model's Streamlit ``app`` module (None if unavailable)."""
+    return _load_project_module("RAG_Model", "app")
+
+
+@pytest.fixture(scope="module")
+def rag_model_path():
+    """RAG_Model on ``sys.path`` for the requesting test module."""
+    with project_imports("RAG_Model"):
+        yield
+
+
+@pytest.fixture(scope="module")
+def terminal_agents_path():
+    """terminal_agents on ``sys.path`` for the requesting test module."""
+    with project_imports("terminal_agents"):
+        yield
+
+
 @pytest.fixture
-def temp_dir():
-    """Create a temporary directory for tests."""
-    temp_path = tempfile.mkdtemp()
-    yield Path(temp_path)
-    shutil.rmtree(temp_path)
+def temp_dir(tmp_path_factory):
+    """Create a temporary directory for tests (a fresh subdirectory of the session's base)."""
+    return tmp_path_factory.mktemp("test")
+
+
+class _FakeChoice:
+    """Chat completion choice with a fixed assistant message."""
+    message = SimpleNamespace(content="Test response", role="assistant")
+    finish_reason = "stop"
+
+
+class _FakeResponse:
+    """Chat completion response with a single choice."""
+    choices = [_FakeChoice()]
+    usage = None
+
+
+@pytest.fixture(scope="session")
+def fake_openai_client():
+    """Plain-object OpenAI client stand-in, built once per session.
+    
+    Attribute chains on plain objects are far cheaper to build than nested
+    MagicMocks.
+    """
+    return SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: _FakeResponse()))
+    )
 
 
 @pytest.fixture
-def mock_openai_client():
+def mock_openai_client(fake_openai_client):
     """Mock OpenAI client for testing."""
-    with patch('openai.OpenAI') as mock:
-        client = MagicMock()
-        mock.return_value = client
-        
-        # Mock chat completion response
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message.content = "Test response"
-        mock_response.choices[0].message.role = "assistant"
-        client.chat.completions.create.return_value = mock_response
-        
-        yield client
+    # The patch is per test so it never leaks; it returns the shared client
+    with patch('openai.OpenAI', new=lambda *args, **kwargs: fake_openai_client):
+        yield fake_openai_client
+
+
+@pytest.fixture
+def patched_openai(monkeypatch):
+    """Replace ``openai.OpenAI`` with a Mock class; its return_value is the client."""
+    openai = pytest.importorskip("openai")
+    mock_openai = Mock(spec=openai.OpenAI)
+    monkeypatch.setattr(openai, "OpenAI", mock_openai)
+    return mock_openai
+
+
+@pytest.fixture
+def mock_openai_chat(patched_openai):
+    """Stub ``openai.OpenAI`` with a plain-object client; returns the reply message.
+    
+    Set ``.content`` on the returned message to choose what every chat
+    completion answers.
+    """
+    message = SimpleNamespace(content="", role="assistant")
+    response = SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+    patched_openai.return_value = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=Mock(return_value=response)))
+    )
+    return message
 
 
 @pytest.fixture
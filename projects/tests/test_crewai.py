@@ -3,39 +3,39 @@ Tests for CrewAI Multi-Agent Swarm System
 """
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import patch
 
-# Add Crewai to path
-CREWAI_DIR = Path(__file__).parent.parent / "Crewai"
-sys.path.insert(0, str(CREWAI_DIR))
 
-from config import Config
+@pytest.fixture
+def Config(crewai_config):
+    """Crewai's Config class."""
+    if crewai_config is None:
+        pytest.skip("Crewai config not available")
+    return crewai_config.Config
 
 
 class TestConfig:
     """Test configuration module."""
     
-    def test_config_initialization(self):
+    def test_config_initialization(self, Config):
         """Test that config initializes correctly."""
         assert Config is not None
         assert hasattr(Config, 'OLLAMA_BASE_URL')
         assert hasattr(Config, 'OPENAI_API_KEY')
     
-    def test_get_available_providers(self):
+    def test_get_available_providers(self, Config):
         """Test getting available providers."""
         providers = Config.get_available_providers()
         assert isinstance(providers, list)
         assert len(providers) > 0
     
-    def test_detect_best_provider(self, mock_env_vars):
+    def test_detect_best_provider(self, Config, mock_env_vars):
         """Test provider detection."""
         provider = Config.detect_best_provider()
         # Should detect at least one provider if env vars are set
         assert provider is None or isinstance(provider, str)
     
-    def test_validate_environment(self):
+    def test_validate_environment(self, Config):
         """Test environment validation."""
         validation = Config.validate_environment()
         assert isinstance(validation, dict)
@@ -63,89 +63,79 @@ class TestMainModule:
 class TestCrews:
     """Test crew classes."""
     
-    def test_crew_imports(self):
+    def test_crew_imports(self, crewai_import):
         """Test that crew classes can be imported."""
-        try:
-            from crews import (
-                MLCrew,
-                ResearchCrew,
-                ResearchAcademicCrew,
-                ResearchContentCrew,
-                BusinessIntelligenceCrew,
-                DevCodeCrew,
-                DocumentationCrew,
-            )
-            assert True
-        except ImportError as e:
-            pytest.skip(f"Crew classes not available: {e}")
+        crews = crewai_import("crews")
+        if crews is None:
+            pytest.skip("Crew classes not available")
+        for name in (
+            "MLCrew",
+            "ResearchCrew",
+            "ResearchAcademicCrew",
+            "ResearchContentCrew",
+            "BusinessIntelligenceCrew",
+            "DevCodeCrew",
+            "DocumentationCrew",
+        ):
+            assert hasattr(crews, name)
     
-    def test_ml_crew_exists(self):
+    def test_ml_crew_exists(self, crewai_import):
         """Test ML crew class exists."""
-        try:
-            from crews import MLCrew
-            assert MLCrew is not None
-        except ImportError:
+        crews = crewai_import("crews")
+        if crews is None:
             pytest.skip("MLCrew not available")
+        assert crews.MLCrew is not None
 
 
 class TestAgents:
     """Test agent classes."""
     
-    def test_agent_imports(self):
+    def test_agent_imports(self, crewai_import):
         """Test that agent classes can be imported."""
-        try:
-            from agents import (
-                business_intelligence_agents,
-                hyperparameter_optimizer,
-                literature_reviewer,
-            )
-            assert True
-        except ImportError as e:
-            pytest.skip(f"Agent modules not available: {e}")
+        for name in (
+            "business_intelligence_agents",
+            "hyperparameter_optimizer",
+            "literature_reviewer",
+        ):
+            if crewai_import(f"agents.{name}") is None:
+                pytest.skip(f"Agent modules not available: {name}")
 
 
 class TestTools:
     """Test tool classes."""
     
-    def test_tool_imports(self):
+    def test_tool_imports(self, crewai_import):
         """Test that tool classes can be imported."""
-        try:
-            from tools import (
-                academic_tools,
-                business_intelligence_tools,
-                content_tools,
-                dev_tools,
-                documentation_tools,
-                ml_tools,
-                research_tools,
-            )
-            assert True
-        except ImportError as e:
-            pytest.skip(f"Tool modules not available: {e}")
+        for name in (
+            "academic_tools",
+            "business_intelligence_tools",
+            "content_tools",
+            "dev_tools",
+            "documentation_tools",
+            "ml_tools",
+            "research_tools",
+        ):
+            if crewai_import(f"tools.{name}") is None:
+                pytest.skip(f"Tool modules not available: {name}")
 
 
 class TestLLMConfig:
     """Test LLM configuration."""
     
-    def test_llm_config_import(self):
+    def test_llm_config_import(self, crewai_import):
         """Test LLM config can be imported."""
-        try:
-            from llm_config import (
-                get_setup_instructions,
-                get_llm_for_agent,
-                configure_crewai_environment,
-            )
-            assert callable(get_setup_instructions)
-        except ImportError:
+        llm_config = crewai_import("llm_config")
+        if llm_config is None:
             pytest.skip("LLM config not available")
+        assert callable(llm_config.get_setup_instructions)
+        assert callable(llm_config.get_llm_for_agent)
+        assert callable(llm_config.configure_crewai_environment)
     
-    @patch('llm_config.config')
-    def test_get_llm_for_agent(self, mock_config):
+    def test_get_llm_for_agent(self, crewai_import):
         """Test getting LLM for agent."""
-        try:
-            from llm_config import get_llm_for_agent
-            # This would require actual LLM setup, so we'll mock it
-            assert True
-        except ImportError:
+        llm_config = crewai_import("llm_config")
+        if llm_config is None:
             pytest.skip("LLM config not available")
-
+        # This would require actual LLM setup, so we'll mock it
+        with patch.object(llm_config, 'config'):
+            assert llm_config.get_llm_for_agent is not None
@@ -3,59 +3,51 @@ Tests for iOS-Inspired Chatbot Application
 """
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch, call
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 import os
 
-# Add ios_chatbot to path
-IOS_CHATBOT_DIR = Path(__file__).parent.parent / "ios_chatbot"
-sys.path.insert(0, str(IOS_CHATBOT_DIR))
+_VALID_ROLES = frozenset(("user", "assistant", "system"))
+_MODELS = ("gpt-3.5-turbo", "gpt-4", "gpt-4-turbo-preview")
 
 
 class TestIOSChatbot:
     """Test iOS chatbot application."""
     
-    def test_imports(self):
+    def test_imports(self, ios_app):
         """Test that the app can be imported."""
-        try:
-            import app
-            assert True
-        except ImportError as e:
-            pytest.skip(f"App not available: {e}")
+        if ios_app is None:
+            pytest.skip("App not available")
     
-    @patch('streamlit.set_page_config')
-    @patch('streamlit.markdown')
-    def test_page_config(self, mock_markdown, mock_page_config):
+    def test_page_config(self, monkeypatch, ios_app):
         """Test page configuration."""
-        try:
-            import app
-            # Verify page config was called
-            assert True
-        except ImportError:
+        if ios_app is None:
             pytest.skip("App not available")
+        streamlit = pytest.importorskip("streamlit")
+        monkeypatch.setattr(streamlit, "set_page_config", Mock())
+        monkeypatch.setattr(streamlit, "markdown", Mock())
+        # Verify page config was called
+        assert True
     
-    @patch('openai.OpenAI')
-    def test_openai_client_creation(self, mock_openai):
+    def test_openai_client_creation(self, patched_openai):
         """Test OpenAI client creation."""
-        mock_client = MagicMock()
-        mock_openai.return_value = mock_client
+        import openai
         
-        client = mock_openai(api_key="test_key")
-        assert client is not None
-        mock_openai.assert_called_once()
+        client = openai.OpenAI(api_key="test_key")
+        assert client is patched_openai.return_value
+        patched_openai.assert_called_once()
     
-    @patch('openai.OpenAI')
-    def test_chat_completion(self, mock_openai):
+    def test_chat_completion(self, patched_openai):
         """Test chat completion functionality."""
-        mock_client = MagicMock()
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message.content = "Test response"
-        mock_client.chat.completions.create.return_value = mock_response
-        mock_openai.return_value = mock_client
+        # Only the call is mocked; the response is plain data
+        mock_response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Test response", role="assistant"))]
+        )
+        patched_openai.return_value = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=Mock(return_value=mock_response)))
+        )
         
-        client = mock_openai(api_key="test_key")
+        client = patched_openai(api_key="test_key")
         response = client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": "Hello"}]
@@ -71,7 +63,7 @@ class TestIOSChatbot:
         
         # Basic format check
         assert isinstance(content, str)
-        assert role in ["user", "assistant", "system"]
+        assert role in _VALID_ROLES
     
     @patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"})
     def test_env_var_loading(self):
@@ -103,7 +95,7 @@ class TestChatInterface:
             "content": "Hello, world!"
         }
         
-        assert message["role"] in ["user", "assistant", "system"]
+        assert message["role"] in _VALID_ROLES
         assert isinstance(message["content"], str)
         assert len(message["content"]) > 0
     
@@ -129,16 +121,13 @@ class TestModelSelection:
     
     def test_model_options(self):
         """Test available model options."""
-        models = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo-preview"]
-        
-        assert "gpt-3.5-turbo" in models
-        assert "gpt-4" in models
-        assert len(models) > 0
+        assert "gpt-3.5-turbo" in _MODELS
+        assert "gpt-4" in _MODELS
+        assert len(_MODELS) > 0
     
     def test_model_validation(self):
         """Test model name validation."""
-        valid_models = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo-preview"]
         test_model = "gpt-3.5-turbo"
         
-        assert test_model in valid_models
+        assert test_model in _MODELS
 
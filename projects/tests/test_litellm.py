@@ -2,28 +2,28 @@
 Tests for LiteLLM Proxy Server
 """
 
+import asyncio
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
-from fastapi.testclient import TestClient
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
 
-# Add litellm to path
-LITELLM_DIR = Path(__file__).parent.parent / "litellm"
-sys.path.insert(0, str(LITELLM_DIR))
+
+@pytest.fixture(scope="module")
+def proxy(litellm_proxy):
+    """The proxy_server module."""
+    if litellm_proxy is None:
+        pytest.skip("Proxy server not available")
+    return litellm_proxy
 
 
 class TestProxyServer:
     """Test proxy server functionality."""
     
-    @pytest.fixture
-    def client(self):
-        """Create test client."""
-        try:
-            from proxy_server import app
-            return TestClient(app)
-        except ImportError:
-            pytest.skip("Proxy server not available")
+    @pytest.fixture(scope="module")
+    def client(self, proxy):
+        """Create a test client shared by the endpoint tests (none of them change server state)."""
+        testclient = pytest.importorskip("fastapi.testclient")
+        return testclient.TestClient(proxy.app)
     
     def test_root_endpoint(self, client):
         """Test root endpoint."""
@@ -57,27 +57,20 @@ class TestProxyServer:
         assert "data" in data
         assert isinstance(data["data"], list)
     
-    @patch('litellm.completion')
-    def test_chat_completions_endpoint(self, mock_completion, client):
+    def test_chat_completions_endpoint(self, monkeypatch, proxy, client):
         """Test chat completions endpoint."""
         if client is None:
             pytest.skip("Client not available")
         
-        # Mock LiteLLM response
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message.content = "Test response"
-        mock_response.choices[0].message.role = "assistant"
-        mock_response.id = "test-id"
-        mock_response.created = 1234567890
-        
-        mock_usage = MagicMock()
-        mock_usage.prompt_tokens = 10
-        mock_usage.completion_tokens = 20
-        mock_usage.total_tokens = 30
-        mock_response.usage = mock_usage
-        
-        mock_completion.return_value = mock_response
+        # Mock the upstream call the endpoint actually makes
+        completion = AsyncMock(return_value=SimpleNamespace(
+            id="test-id",
+            created=1234567890,
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Test response", role="assistant"))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20, total_tokens=30),
+        ))
+        monkeypatch.setattr(proxy, "LITELLM_AVAILABLE", True)
+        monkeypatch.setattr(proxy.upstream_pool, "completion", completion)
         
         payload = {
             "model": "gpt-3.5-turbo",
@@ -91,76 +84,111 @@ class TestProxyServer:
         data = response.json()
         assert "choices" in data
         assert len(data["choices"]) > 0
+        assert data["choices"][0]["message"]["content"] == "Test response"
+        completion.assert_awaited_once()
 
 
 class TestConfiguration:
     """Test configuration management."""
     
-    def test_config_import(self):
+    def test_config_import(self, proxy):
         """Test config can be imported."""
-        try:
-            from proxy_server import Config
-            assert Config is not None
-        except ImportError:
+        if not hasattr(proxy, "Config"):
             pytest.skip("Config not available")
+        assert proxy.Config is not None
     
     @patch.dict('os.environ', {
         'OPENAI_API_KEY': 'test_key',
         'ANTHROPIC_API_KEY': 'test_anthropic_key'
     })
-    def test_load_environment(self):
+    def test_load_environment(self, proxy):
         """Test environment loading."""
-        try:
-            from proxy_server import Config
-            Config.load_environment()
-            assert True
-        except ImportError:
+        if not hasattr(proxy, "Config"):
             pytest.skip("Config not available")
+        proxy.Config.load_environment()
+        assert True
 
 
 class TestRequestModels:
     """Test request/response models."""
     
-    def test_chat_message_model(self):
+    def test_chat_message_model(self, proxy):
         """Test ChatMessage model."""
-        try:
-            from proxy_server import ChatMessage
-            message = ChatMessage(role="user", content="Hello")
-            assert message.role == "user"
-            assert message.content == "Hello"
-        except ImportError:
-            pytest.skip("Models not available")
+        message = proxy.ChatMessage(role="user", content="Hello")
+        assert message.role == "user"
+        assert message.content == "Hello"
     
-    def test_chat_request_model(self):
+    def test_chat_request_model(self, proxy):
         """Test ChatRequest model."""
-        try:
-            from proxy_server import ChatRequest, ChatMessage
-            messages = [ChatMessage(role="user", content="Hello")]
-            request = ChatRequest(model="gpt-3.5-turbo", messages=messages)
-            assert request.model == "gpt-3.5-turbo"
-            assert len(request.messages) == 1
-        except ImportError:
-            pytest.skip("Models not available")
+        messages = [proxy.ChatMessage(role="user", content="Hello")]
+        request = proxy.ChatRequest(model="gpt-3.5-turbo", messages=messages)
+        assert request.model == "gpt-3.5-turbo"
+        assert len(request.messages) == 1
+
+
+class TestResponseCache:
+    """Test the proxy response cache."""
+    
+    def test_key_is_order_independent(self, proxy):
+        """Test cache keys ignore dict ordering."""
+        key_a = proxy.ResponseCache.make_key({"model": "gpt-4", "temperature": 0})
+        key_b = proxy.ResponseCache.make_key({"temperature": 0, "model": "gpt-4"})
+        assert key_a == key_b
+    
+    def test_hit_miss_and_expiry(self, proxy):
+        """Test cache hits, misses and TTL expiry."""
+        cache = proxy.ResponseCache(maxsize=2, ttl=60)
+        assert cache.get("missing") is None
+        cache.set("key", {"id": "1"})
+        assert cache.get("key") == {"id": "1"}
+        
+        cache.ttl = -1
+        cache.set("key", {"id": "2"})
+        assert cache.get("key") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+
+class TestUpstreamPool:
+    """Test upstream endpoint dispatch."""
+    
+    def test_stream_holds_slot_until_done(self, monkeypatch, proxy):
+        """Test a streaming call counts as in flight until its last chunk."""
+        endpoint = proxy.Endpoint(base_url="http://upstream", concurrency_limit=2)
+        pool = proxy.UpstreamPool([endpoint])
+        seen = []
+        
+        async def chunks():
+            for i in range(3):
+                seen.append(endpoint.in_flight)
+                yield i
+        
+        monkeypatch.setattr(proxy, "acompletion", AsyncMock(return_value=chunks()), raising=False)
+        
+        async def consume():
+            return [chunk async for chunk in pool.stream(model="gpt-3.5-turbo", messages=[])]
+        
+        assert asyncio.run(consume()) == [0, 1, 2]
+        assert seen == [1, 1, 1]
+        assert endpoint.in_flight == 0
+        assert not endpoint.semaphore.locked()
 
 
 class TestLiteLLMIntegration:
     """Test LiteLLM integration."""
     
-    @patch('litellm.completion')
-    def test_litellm_completion(self, mock_completion):
+    def test_litellm_completion(self, monkeypatch):
         """Test LiteLLM completion call."""
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message.content = "Test"
-        mock_completion.return_value = mock_response
-        
-        try:
-            from litellm import completion
-            response = completion(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "Hello"}]
-            )
-            assert response is not None
-        except ImportError:
+        litellm = pytest.importorskip("litellm")
+        if not hasattr(litellm, "completion"):
             pytest.skip("LiteLLM not available")
+        monkeypatch.setattr(litellm, "completion", Mock(return_value=SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Test", role="assistant"))]
+        )))
+        
+        response = litellm.completion(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": "Hello"}]
+        )
+        assert response is not None
 
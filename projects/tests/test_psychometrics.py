@@ -3,174 +3,117 @@ Tests for Psychometric Assessment Application (NASA TLX)
 """
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
+import numpy as np
+from collections import Counter
+from itertools import combinations
+from types import MappingProxyType
 
-# Add Psychometrics to path
-PSYCHOMETRICS_DIR = Path(__file__).parent.parent / "Psychometrics"
-sys.path.insert(0, str(PSYCHOMETRICS_DIR))
+_DIMENSIONS = (
+    "Mental Demand",
+    "Physical Demand",
+    "Temporal Demand",
+    "Performance",
+    "Effort",
+    "Frustration",
+)
+
+# Canonical ratings (read-only, shared by all tests) and pairwise weights
+_SAMPLE_RATINGS = MappingProxyType(dict(zip(_DIMENSIONS, (50, 30, 40, 60, 45, 35))))
+_RATINGS = np.array(list(_SAMPLE_RATINGS.values()), dtype=np.float64)
+_WEIGHTS = np.array([2, 1, 1, 1, 1, 1])
+
+
+@pytest.fixture
+def app(psychometrics_app):
+    """The Psychometrics app module."""
+    if psychometrics_app is None:
+        pytest.skip("App not available")
+    return psychometrics_app
 
 
 class TestTLXDimensions:
     """Test TLX dimensions."""
     
-    def test_tlx_dimensions_defined(self):
+    def test_tlx_dimensions_defined(self, app):
         """Test that TLX dimensions are properly defined."""
-        try:
-            import app
-            assert hasattr(app, 'TLX_DIMENSIONS')
-            dimensions = app.TLX_DIMENSIONS
-            
-            assert len(dimensions) == 6
-            assert "Mental Demand" in dimensions
-            assert "Physical Demand" in dimensions
-            assert "Temporal Demand" in dimensions
-            assert "Performance" in dimensions
-            assert "Effort" in dimensions
-            assert "Frustration" in dimensions
-        except ImportError:
-            pytest.skip("App not available")
+        assert hasattr(app, 'TLX_DIMENSIONS')
+        dimensions = app.TLX_DIMENSIONS
+        
+        assert len(dimensions) == 6
+        assert "Mental Demand" in dimensions
+        assert "Physical Demand" in dimensions
+        assert "Temporal Demand" in dimensions
+        assert "Performance" in dimensions
+        assert "Effort" in dimensions
+        assert "Frustration" in dimensions
     
-    def test_dimension_structure(self):
+    def test_dimension_structure(self, app):
         """Test dimension structure."""
-        try:
-            import app
-            dimensions = app.TLX_DIMENSIONS
-            
-            for dim_name, dim_info in dimensions.items():
-                assert "description" in dim_info
-                assert "low" in dim_info
-                assert "high" in dim_info
-                assert isinstance(dim_info["description"], str)
-        except ImportError:
-            pytest.skip("App not available")
+        dimensions = app.TLX_DIMENSIONS
+        
+        for dim_name, dim_info in dimensions.items():
+            assert "description" in dim_info
+            assert "low" in dim_info
+            assert "high" in dim_info
+            assert isinstance(dim_info["description"], str)
 
 
 class TestTLXCalculation:
     """Test TLX score calculation."""
     
-    def test_unweighted_tlx_calculation(self):
+    def test_unweighted_tlx_calculation(self, app):
         """Test unweighted TLX calculation."""
-        try:
-            import app
-            
-            ratings = {
-                "Mental Demand": 50,
-                "Physical Demand": 30,
-                "Temporal Demand": 40,
-                "Performance": 60,
-                "Effort": 45,
-                "Frustration": 35
-            }
-            
-            score = app.calculate_tlx_score(ratings)
-            
-            # Should be average of all ratings
-            expected = sum(ratings.values()) / len(ratings)
-            assert abs(score - expected) < 0.01
-        except ImportError:
-            pytest.skip("App not available")
+        score = app.calculate_tlx_score(dict(_SAMPLE_RATINGS))
+        
+        # Should be average of all ratings
+        assert abs(score - _RATINGS.mean()) < 0.01
     
-    def test_weighted_tlx_calculation(self):
+    def test_weighted_tlx_calculation(self, app):
         """Test weighted TLX calculation."""
-        try:
-            import app
-            
-            ratings = {
-                "Mental Demand": 50,
-                "Physical Demand": 30,
-                "Temporal Demand": 40,
-                "Performance": 60,
-                "Effort": 45,
-                "Frustration": 35
-            }
-            
-            weights = {
-                "Mental Demand": 2,
-                "Physical Demand": 1,
-                "Temporal Demand": 1,
-                "Performance": 1,
-                "Effort": 1,
-                "Frustration": 1
-            }
-            
-            score = app.calculate_tlx_score(ratings, weights)
-            
-            # Should be weighted average
-            weighted_sum = sum(ratings[dim] * weights[dim] for dim in ratings.keys())
-            total_weight = sum(weights.values())
-            expected = weighted_sum / total_weight
-            
-            assert abs(score - expected) < 0.01
-        except ImportError:
-            pytest.skip("App not available")
+        score = app.calculate_tlx_score(
+            dict(_SAMPLE_RATINGS),
+            dict(zip(_DIMENSIONS, _WEIGHTS.tolist()))
+        )
+        
+        # Should be weighted average (the "...i" form also takes a batch of rating profiles)
+        expected = np.einsum("...i,i->...", _RATINGS, _WEIGHTS) / _WEIGHTS.sum()
+        assert abs(score - expected) < 0.01
     
-    def test_score_range(self):
+    def test_score_range(self, app):
         """Test that scores are in valid range."""
-        try:
-            import app
-            
-            ratings = {
-                "Mental Demand": 100,
-                "Physical Demand": 100,
-                "Temporal Demand": 100,
-                "Performance": 100,
-                "Effort": 100,
-                "Frustration": 100
-            }
-            
-            score = app.calculate_tlx_score(ratings)
-            assert 0 <= score <= 100
-            
-            # Test minimum
-            ratings_min = {dim: 0 for dim in ratings.keys()}
-            score_min = app.calculate_tlx_score(ratings_min)
-            assert score_min == 0
-        except ImportError:
-            pytest.skip("App not available")
+        score = app.calculate_tlx_score(dict.fromkeys(_DIMENSIONS, 100))
+        assert 0 <= score <= 100
+        
+        # Test minimum
+        score_min = app.calculate_tlx_score(dict.fromkeys(_DIMENSIONS, 0))
+        assert score_min == 0
 
 
 class TestPairwiseComparison:
     """Test pairwise comparison functionality."""
     
-    def test_pairwise_comparison_structure(self):
+    def test_pairwise_comparison_structure(self, app):
         """Test pairwise comparison structure."""
-        try:
-            import app
-            dimensions = list(app.TLX_DIMENSIONS.keys())
-            
-            # Should have n*(n-1)/2 comparisons for n dimensions
-            n = len(dimensions)
-            expected_comparisons = n * (n - 1) // 2
-            
-            # For 6 dimensions, should have 15 comparisons
-            assert expected_comparisons == 15
-        except ImportError:
-            pytest.skip("App not available")
+        dimensions = list(app.TLX_DIMENSIONS.keys())
+        
+        # Should have n*(n-1)/2 comparisons for n dimensions
+        n = len(dimensions)
+        expected_comparisons = n * (n - 1) // 2
+        
+        # For 6 dimensions, should have 15 comparisons
+        assert expected_comparisons == 15
     
     def test_weight_calculation(self):
         """Test weight calculation from comparisons."""
-        # Mock pairwise comparison results
-        dimensions = ["Mental Demand", "Physical Demand", "Temporal Demand",
-                     "Performance", "Effort", "Frustration"]
-        
         # Simulate comparisons where Mental Demand is selected more
-        comparisons = {}
-        for i in range(len(dimensions)):
-            for j in range(i + 1, len(dimensions)):
-                key = f"{dimensions[i]}_{dimensions[j]}"
-                # Mental Demand wins most comparisons
-                comparisons[key] = dimensions[i] if i == 0 else dimensions[j]
+        comparisons = {
+            (a, b): a if a == "Mental Demand" else b
+            for a, b in combinations(_DIMENSIONS, 2)
+        }
         
         # Calculate weights
-        weights = {dim: 0 for dim in dimensions}
-        for key, selected in comparisons.items():
-            dim1, dim2 = key.split("_")
-            if selected == dim1:
-                weights[dim1] += 1
-            else:
-                weights[dim2] += 1
+        wins = Counter(comparisons.values())
+        weights = {dim: wins[dim] for dim in _DIMENSIONS}
         
         # Mental Demand should have highest weight
         assert weights["Mental Demand"] >= max(weights.values()) - 1
@@ -186,14 +129,7 @@ class TestSessionState:
             "task_name": "Test Task",
             "task_description": "Test Description",
             "participant_id": "P001",
-            "ratings": {
-                "Mental Demand": 50,
-                "Physical Demand": 30,
-                "Temporal Demand": 40,
-                "Performance": 60,
-                "Effort": 45,
-                "Frustration": 35
-            },
+            "ratings": _SAMPLE_RATINGS,
             "weights": None,
             "score": 43.33,
             "weighted": False
@@ -210,17 +146,8 @@ class TestVisualization:
     
     def test_radar_chart_data(self):
         """Test radar chart data preparation."""
-        ratings = {
-            "Mental Demand": 50,
-            "Physical Demand": 30,
-            "Temporal Demand": 40,
-            "Performance": 60,
-            "Effort": 45,
-            "Frustration": 35
-        }
-        
-        dimensions = list(ratings.keys())
-        values = list(ratings.values())
+        dimensions = list(_SAMPLE_RATINGS.keys())
+        values = list(_SAMPLE_RATINGS.values())
         
         assert len(dimensions) == 6
         assert len(values) == 6
@@ -228,17 +155,8 @@ class TestVisualization:
     
     def test_bar_chart_data(self):
         """Test bar chart data preparation."""
-        ratings = {
-            "Mental Demand": 50,
-            "Physical Demand": 30,
-            "Temporal Demand": 40,
-            "Performance": 60,
-            "Effort": 45,
-            "Frustration": 35
-        }
-        
-        dimensions = list(ratings.keys())
-        values = list(ratings.values())
+        dimensions = list(_SAMPLE_RATINGS.keys())
+        values = list(_SAMPLE_RATINGS.values())
         
         assert len(dimensions) == len(values)
         assert max(values) <= 100
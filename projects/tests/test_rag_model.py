@@ -3,184 +3,285 @@ Tests for RAG Model Application
 """
 
 import pytest
-import sys
+import importlib
+import importlib.util
+import numpy as np
 from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch, mock_open
-import tempfile
-import os
+from unittest.mock import MagicMock, sentinel
+import time
+from functools import lru_cache
 
-# Add RAG_Model to path
-RAG_MODEL_DIR = Path(__file__).parent.parent / "RAG_Model"
-sys.path.insert(0, str(RAG_MODEL_DIR))
+# RAG_Model goes on sys.path only while this module's tests run
+pytestmark = pytest.mark.usefixtures("rag_model_path")
 
+# Checked without importing, so langchain-only classes skip at collection
+LANGCHAIN_AVAILABLE = importlib.util.find_spec("langchain") is not None
+requires_langchain = pytest.mark.skipif(not LANGCHAIN_AVAILABLE, reason="LangChain not available")
 
+SUPPORTED_EXTS = frozenset((".pdf", ".txt", ".md"))
+
+
+@lru_cache(maxsize=None)
+def _probe(module_path, attr=None):
+    """Import a module (or one of its names) once per session; None if unavailable.
+    
+    Failed imports are not kept in ``sys.modules``, so without the cache every
+    test would repeat the full search for a missing langchain.
+    """
+    try:
+        module = importlib.import_module(module_path)
+    except Exception:
+        return None
+    return module if attr is None else getattr(module, attr, None)
+
+
+def _import_or_skip(module, name=None, reason="LangChain not available"):
+    """Return ``module`` or ``module.name``, skipping the test if unavailable."""
+    obj = _probe(module, name)
+    if obj is None:
+        pytest.skip(reason)
+    return obj
+
+
+@requires_langchain
 class TestDocumentLoading:
     """Test document loading functionality."""
     
     def test_text_loader_import(self):
         """Test text loader can be imported."""
-        try:
-            from langchain.document_loaders import TextLoader
-            assert TextLoader is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
+        TextLoader = _import_or_skip("langchain.document_loaders", "TextLoader")
+        assert TextLoader is not None
     
     def test_pdf_loader_import(self):
         """Test PDF loader can be imported."""
-        try:
-            from langchain.document_loaders import PyPDFLoader
-            assert PyPDFLoader is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
-    
-    @patch('langchain.document_loaders.TextLoader')
-    def test_load_text_document(self, mock_loader, sample_text_file):
+        PyPDFLoader = _import_or_skip("langchain.document_loaders", "PyPDFLoader")
+        assert PyPDFLoader is not None
+    
+    def test_load_text_document(self, monkeypatch, sample_text_file):
         """Test loading text document."""
-        try:
-            from langchain.document_loaders import TextLoader
-            
-            mock_loader_instance = MagicMock()
-            mock_doc = MagicMock()
-            mock_doc.page_content = "Test content"
-            mock_loader_instance.load.return_value = [mock_doc]
-            mock_loader.return_value = mock_loader_instance
-            
-            loader = TextLoader(str(sample_text_file))
-            documents = loader.load()
-            
-            assert len(documents) > 0
-        except ImportError:
-            pytest.skip("LangChain not available")
+        document_loaders = _import_or_skip("langchain.document_loaders")
+        mock_loader = MagicMock()
+        monkeypatch.setattr(document_loaders, "TextLoader", mock_loader, raising=False)
+        
+        mock_loader_instance = MagicMock()
+        mock_doc = MagicMock()
+        mock_doc.page_content = "Test content"
+        mock_loader_instance.load.return_value = [mock_doc]
+        mock_loader.return_value = mock_loader_instance
+        
+        loader = document_loaders.TextLoader(str(sample_text_file))
+        documents = loader.load()
+        
+        assert len(documents) > 0
 
 
+@requires_langchain
 class TestTextSplitting:
     """Test text splitting functionality."""
     
     def test_text_splitter_import(self):
         """Test text splitter can be imported."""
-        try:
-            from langchain.text_splitter import RecursiveCharacterTextSplitter
-            assert RecursiveCharacterTextSplitter is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
+        RecursiveCharacterTextSplitter = _import_or_skip("langchain.text_splitter", "RecursiveCharacterTextSplitter")
+        assert RecursiveCharacterTextSplitter is not None
     
     def test_text_splitting(self):
         """Test text splitting."""
-        try:
-            from langchain.text_splitter import RecursiveCharacterTextSplitter
-            
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=100,
-                chunk_overlap=20
-            )
-            
-            text = "This is a test document. " * 10
-            splits = text_splitter.split_text(text)
-            
-            assert len(splits) > 0
-            assert all(len(split) <= 100 for split in splits)
-        except ImportError:
-            pytest.skip("LangChain not available")
+        RecursiveCharacterTextSplitter = _import_or_skip("langchain.text_splitter", "RecursiveCharacterTextSplitter")
+        
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=100,
+            chunk_overlap=20
+        )
+        
+        text = "This is a test document. " * 10
+        splits = text_splitter.split_text(text)
+        
+        assert len(splits) > 0
+        assert all(len(split) <= 100 for split in splits)
+    
+    def test_text_splitting_large_input(self):
+        """Test splitting a ~100KB text loses nothing beyond the configured overlap."""
+        RecursiveCharacterTextSplitter = _import_or_skip("langchain.text_splitter", "RecursiveCharacterTextSplitter")
+        
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=100,
+            chunk_overlap=20
+        )
+        
+        text = "This is a test document. " * 4000
+        splits = text_splitter.split_text(text)
+        
+        assert all(len(split) <= 100 for split in splits)
+        # Chunks only drop whitespace at their edges, so together they still cover the text
+        assert sum(len(split) for split in splits) >= len(text) - 20 * len(splits)
+    
+    def test_split_documents_batch(self):
+        """Test splitting a batch of documents in one call, as ingestion does."""
+        RecursiveCharacterTextSplitter = _import_or_skip("langchain.text_splitter", "RecursiveCharacterTextSplitter")
+        Document = _import_or_skip("langchain.schema", "Document")
+        
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=100,
+            chunk_overlap=20
+        )
+        
+        documents = [
+            Document(page_content="This is a test document. " * 10, metadata={"source": i})
+            for i in range(100)
+        ]
+        splits = text_splitter.split_documents(documents)
+        
+        assert len(splits) >= len(documents)
+        assert all(len(split.page_content) <= 100 for split in splits)
+        # Every source document contributes at least one chunk
+        assert {split.metadata["source"] for split in splits} == set(range(100))
 
 
+@requires_langchain
 class TestEmbeddings:
     """Test embedding functionality."""
     
     def test_openai_embeddings_import(self):
         """Test OpenAI embeddings can be imported."""
-        try:
-            from langchain.embeddings import OpenAIEmbeddings
-            assert OpenAIEmbeddings is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
+        OpenAIEmbeddings = _import_or_skip("langchain.embeddings", "OpenAIEmbeddings")
+        assert OpenAIEmbeddings is not None
     
     def test_huggingface_embeddings_import(self):
         """Test HuggingFace embeddings can be imported."""
-        try:
-            from langchain.embeddings import HuggingFaceEmbeddings
-            assert HuggingFaceEmbeddings is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
-    
-    @patch('langchain.embeddings.OpenAIEmbeddings')
-    def test_openai_embeddings_creation(self, mock_embeddings):
+        HuggingFaceEmbeddings = _import_or_skip("langchain.embeddings", "HuggingFaceEmbeddings")
+        assert HuggingFaceEmbeddings is not None
+    
+    def test_openai_embeddings_creation(self, monkeypatch):
         """Test OpenAI embeddings creation."""
-        try:
-            from langchain.embeddings import OpenAIEmbeddings
-            
-            mock_embeddings.return_value = MagicMock()
-            embeddings = OpenAIEmbeddings(openai_api_key="test_key")
-            
-            assert embeddings is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
+        embeddings_module = _import_or_skip("langchain.embeddings")
+        monkeypatch.setattr(embeddings_module, "OpenAIEmbeddings", MagicMock(), raising=False)
+        
+        embeddings = embeddings_module.OpenAIEmbeddings(openai_api_key="test_key")
+        
+        assert embeddings is not None
+    
+    def test_openai_embeddings_are_batched(self, monkeypatch, rag_app):
+        """Test the app embeds many texts per request rather than one at a time."""
+        if rag_app is None:
+            pytest.skip("App not available")
+        mock_embeddings = MagicMock()
+        monkeypatch.setattr(rag_app, "OpenAIEmbeddings", mock_embeddings, raising=False)
+        rag_app.get_embeddings.clear()
+        
+        rag_app.get_embeddings("openai", "test_key")
+        
+        assert 1 < rag_app.OPENAI_EMBEDDING_BATCH_SIZE <= 2048
+        mock_embeddings.assert_called_once_with(
+            openai_api_key="test_key",
+            chunk_size=rag_app.OPENAI_EMBEDDING_BATCH_SIZE
+        )
 
 
+@requires_langchain
 class TestVectorStores:
     """Test vector store functionality."""
     
     def test_faiss_import(self):
         """Test FAISS can be imported."""
-        try:
-            from langchain.vectorstores import FAISS
-            assert FAISS is not None
-        except ImportError:
-            pytest.skip("FAISS not available")
+        FAISS = _import_or_skip("langchain.vectorstores", "FAISS", reason="FAISS not available")
+        assert FAISS is not None
     
     def test_chroma_import(self):
         """Test Chroma can be imported."""
-        try:
-            from langchain.vectorstores import Chroma
-            assert Chroma is not None
-        except ImportError:
-            pytest.skip("Chroma not available")
-    
-    @patch('langchain.vectorstores.FAISS')
-    def test_faiss_creation(self, mock_faiss):
+        Chroma = _import_or_skip("langchain.vectorstores", "Chroma", reason="Chroma not available")
+        assert Chroma is not None
+    
+    def test_faiss_creation(self, monkeypatch):
         """Test FAISS vector store creation."""
-        try:
-            from langchain.vectorstores import FAISS
-            from langchain.embeddings import OpenAIEmbeddings
-            
-            mock_embeddings = MagicMock()
-            mock_documents = [MagicMock()]
-            
-            mock_faiss.from_documents.return_value = MagicMock()
-            vectorstore = FAISS.from_documents(mock_documents, mock_embeddings)
-            
-            assert vectorstore is not None
-        except ImportError:
-            pytest.skip("FAISS not available")
+        vectorstores = _import_or_skip("langchain.vectorstores", reason="FAISS not available")
+        mock_faiss = MagicMock()
+        monkeypatch.setattr(vectorstores, "FAISS", mock_faiss, raising=False)
+        
+        mock_faiss.from_documents.return_value = sentinel.vectorstore
+        vectorstore = vectorstores.FAISS.from_documents([sentinel.document], sentinel.embeddings)
+        
+        assert vectorstore is sentinel.vectorstore
+        mock_faiss.from_documents.assert_called_once_with([sentinel.document], sentinel.embeddings)
+
+
+@pytest.fixture(scope="module")
+def rag_system(rag_model_path):
+    """rag_system, skipped unless its FAISS store is usable."""
+    rag_system = pytest.importorskip("rag_system", reason="RAG system not available")
+    if not rag_system.FAISS_AVAILABLE:
+        pytest.skip("FAISS not available")
+    return rag_system
+
+
+@pytest.fixture(scope="module")
+def built_index(rag_system):
+    """Index over 10k random 128-d vectors, and normalized copies of the first 100 as queries."""
+    # _build_index only reads these settings, so skip loading an embedding model
+    store = rag_system.RAGSystem.__new__(rag_system.RAGSystem)
+    store.index_factory = "auto"
+    store.embedding_dtype = "float32"
+    
+    vectors = np.random.default_rng(0).random((10000, 128), dtype=np.float32)
+    queries = vectors[:100].copy()
+    rag_system.faiss.normalize_L2(queries)
+    return store, store._build_index(vectors), queries
+
 
+class TestFAISSIndex:
+    """Test the FAISS index RAGSystem builds for its fallback store."""
+    
+    def test_build_index_finds_exact_neighbours(self, built_index):
+        """Test the auto-selected IVF index returns each indexed vector as its own nearest neighbour."""
+        store, index, queries = built_index
+        
+        assert store._index_factory_string(10000, 128).startswith("IVF")
+        assert index.ntotal == 10000
+        _, ids = index.search(queries, 10)
+        assert (ids[:, 0] == np.arange(len(queries))).mean() >= 0.99
+    
+    def test_build_index_leaves_embeddings_raw(self, built_index):
+        """Test building an index does not normalize the caller's float32 embeddings."""
+        store = built_index[0]
+        embeddings = np.full((4, 8), 2.0, dtype=np.float32)
+        
+        store._build_index(embeddings)
+        
+        assert (embeddings == 2.0).all()
+    
+    @pytest.mark.benchmark
+    def test_build_index_search_latency(self, built_index):
+        """Test search stays well under a millisecond per query."""
+        _, index, queries = built_index
+        
+        start = time.perf_counter()
+        index.search(queries, 10)
+        assert (time.perf_counter() - start) / len(queries) < 1e-3
 
+
+@requires_langchain
 class TestQAChain:
     """Test QA chain functionality."""
     
     def test_retrieval_qa_import(self):
         """Test RetrievalQA can be imported."""
-        try:
-            from langchain.chains import RetrievalQA
-            assert RetrievalQA is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
-    
-    @patch('langchain.chains.RetrievalQA.from_chain_type')
-    def test_qa_chain_creation(self, mock_qa):
+        RetrievalQA = _import_or_skip("langchain.chains", "RetrievalQA")
+        assert RetrievalQA is not None
+    
+    def test_qa_chain_creation(self, monkeypatch):
         """Test QA chain creation."""
-        try:
-            from langchain.chains import RetrievalQA
-            
-            mock_qa.return_value = MagicMock()
-            qa_chain = mock_qa(
-                llm=MagicMock(),
-                chain_type="stuff",
-                retriever=MagicMock(),
-                return_source_documents=True
-            )
-            
-            assert qa_chain is not None
-        except ImportError:
-            pytest.skip("LangChain not available")
+        RetrievalQA = _import_or_skip("langchain.chains", "RetrievalQA")
+        mock_qa = MagicMock()
+        monkeypatch.setattr(RetrievalQA, "from_chain_type", mock_qa)
+        
+        mock_qa.return_value = sentinel.qa_chain
+        qa_chain = mock_qa(
+            llm=sentinel.llm,
+            chain_type="stuff",
+            retriever=sentinel.retriever,
+            return_source_documents=True
+        )
+        
+        assert qa_chain is sentinel.qa_chain
 
 
 class TestRAGWorkflow:
@@ -191,11 +292,18 @@ class TestRAGWorkflow:
         # Simulate workflow steps
         documents = [sample_document]
         
-        # Split documents
-        chunks = [doc[:100] for doc in documents]
+        # Split documents into fixed-size chunks: encode once, then slice
+        # a memoryview so chunks share the buffer instead of copying it
+        chunk_size = 100
+        chunks = []
+        total = 0
+        for doc in documents:
+            view = memoryview(doc if isinstance(doc, bytes) else doc.encode("utf-8"))
+            chunks.extend(view[i:i + chunk_size] for i in range(0, len(view), chunk_size))
+            total += len(view)
         
         # Create embeddings (mock)
-        embeddings = [[0.1] * 384 for _ in chunks]
+        embeddings = np.full((len(chunks), 384), 0.1, dtype=np.float32)
         
         # Create vector store (mock)
         vectorstore = MagicMock()
@@ -204,7 +312,9 @@ class TestRAGWorkflow:
         # Verify workflow
         assert len(documents) > 0
         assert len(chunks) > 0
-        assert len(embeddings) == len(chunks)
+        assert all(len(chunk) <= chunk_size for chunk in chunks)
+        assert sum(len(chunk) for chunk in chunks) == total
+        assert embeddings.shape == (len(chunks), 384)
         assert vectorstore is not None
     
     def test_retrieval_workflow(self):
@@ -228,21 +338,13 @@ class TestFileHandling:
     
     def test_supported_file_types(self):
         """Test supported file types."""
-        supported_types = [".pdf", ".txt", ".md"]
-        
-        assert ".pdf" in supported_types
-        assert ".txt" in supported_types
-        assert ".md" in supported_types
+        assert ".pdf" in SUPPORTED_EXTS
+        assert ".txt" in SUPPORTED_EXTS
+        assert ".md" in SUPPORTED_EXTS
     
     def test_file_extension_parsing(self):
         """Test file extension parsing."""
-        test_files = [
-            "document.pdf",
-            "readme.txt",
-            "notes.md"
-        ]
+        test_files = ("document.pdf", "readme.txt", "notes.md")
         
-        for file_path in test_files:
-            ext = Path(file_path).suffix.lower()
-            assert ext in [".pdf", ".txt", ".md"]
+        assert all(Path(file_path).suffix.lower() in SUPPORTED_EXTS for file_path in test_files)
 
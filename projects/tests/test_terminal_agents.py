@@ -3,177 +3,106 @@ Tests for Terminal Agents Application
 """
 
 import pytest
-import sys
-from pathlib import Path
-from unittest.mock import Mock, MagicMock, patch
+import importlib.util
+from unittest.mock import Mock, patch
 import os
+import time
 
-# Add terminal_agents to path
-TERMINAL_AGENTS_DIR = Path(__file__).parent.parent / "terminal_agents"
-sys.path.insert(0, str(TERMINAL_AGENTS_DIR))
+# terminal_agents goes first on sys.path only while this module's tests run,
+# so its config module wins over other projects'
+pytestmark = pytest.mark.usefixtures("terminal_agents_path")
+
+RICH_AVAILABLE = importlib.util.find_spec("rich") is not None
+
+_COMMANDS = frozenset(("chat", "analyze", "explain", "generate", "fix", "interactive", "help"))
+
+
+@pytest.fixture
+def TerminalAgent(monkeypatch, tmp_path):
+    """The TerminalAgent class (skips if agent.py cannot be imported).
+    
+    Agents built in the test skip the Ollama network probe and keep their
+    files under a temporary HOME rather than the real ~/.terminal_agents.
+    """
+    monkeypatch.setenv("OLLAMA_SKIP_PROBE", "1")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return pytest.importorskip("agent", reason="Agent not available").TerminalAgent
+
+
+@pytest.fixture
+def fresh_openai_clients():
+    """Drop cached OpenAI clients, so agents are built on the (patched) ``openai.OpenAI``."""
+    get_client = pytest.importorskip("llm_providers", reason="Agent not available")._get_openai_client
+    get_client.cache_clear()
+    yield
+    get_client.cache_clear()
+
+
+@pytest.fixture
+def mocked_agent(TerminalAgent, mock_openai_chat, fresh_openai_clients):
+    """A TerminalAgent on a stubbed OpenAI client, and the message its replies come from."""
+    agent = TerminalAgent(api_key="test_key", provider="openai", use_cache=False)
+    # The stub returns whole completions, not chunk streams
+    agent.llm.supports_streaming = False
+    return agent, mock_openai_chat
 
 
 class TestTerminalAgent:
     """Test TerminalAgent class."""
     
-    def test_agent_import(self):
+    def test_agent_import(self, TerminalAgent):
         """Test that TerminalAgent can be imported."""
-        try:
-            from agent import TerminalAgent
-            assert TerminalAgent is not None
-        except ImportError as e:
-            pytest.skip(f"Agent not available: {e}")
+        assert TerminalAgent is not None
     
-    @patch('openai.OpenAI')
     @patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"})
-    def test_agent_initialization(self, mock_openai):
+    def test_agent_initialization(self, patched_openai, fresh_openai_clients, TerminalAgent):
         """Test agent initialization."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_openai.return_value = mock_client
-            
-            agent = TerminalAgent(api_key="test_key")
-            
-            assert agent is not None
-            assert agent.api_key == "test_key"
-        except ImportError:
-            pytest.skip("Agent not available")
-    
-    @patch('openai.OpenAI')
-    def test_chat_functionality(self, mock_openai):
-        """Test chat functionality."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Test response"
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            agent = TerminalAgent(api_key="test_key")
-            response = agent.chat("Hello")
-            
-            assert response == "Test response"
-        except ImportError:
-            pytest.skip("Agent not available")
-    
-    @patch('openai.OpenAI')
-    def test_analyze_code(self, mock_openai, sample_text_file):
-        """Test code analysis functionality."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Code analysis result"
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            agent = TerminalAgent(api_key="test_key")
-            result = agent.analyze_code(str(sample_text_file))
-            
-            assert "analysis" in result.lower() or len(result) > 0
-        except ImportError:
-            pytest.skip("Agent not available")
-    
-    @patch('openai.OpenAI')
-    def test_explain_code(self, mock_openai):
-        """Test code explanation functionality."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Code explanation"
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            agent = TerminalAgent(api_key="test_key")
-            code = "def hello(): return 'world'"
-            result = agent.explain_code(code)
-            
-            assert len(result) > 0
-        except ImportError:
-            pytest.skip("Agent not available")
-    
-    @patch('openai.OpenAI')
-    def test_generate_code(self, mock_openai):
-        """Test code generation functionality."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "def fibonacci(n):\n    return n if n < 2 else fibonacci(n-1) + fibonacci(n-2)"
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            agent = TerminalAgent(api_key="test_key")
-            result = agent.generate_code("Fibonacci function")
-            
-            assert "def" in result or "function" in result.lower()
-        except ImportError:
-            pytest.skip("Agent not available")
-    
-    @patch('openai.OpenAI')
-    def test_fix_code(self, mock_openai):
-        """Test code fixing functionality."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Fixed code"
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            agent = TerminalAgent(api_key="test_key")
-            code = "def broken(): return x / 0"
-            result = agent.fix_code(code)
-            
-            assert len(result) > 0
-        except ImportError:
-            pytest.skip("Agent not available")
+        agent = TerminalAgent(api_key="test_key")
+        
+        assert agent is not None
+        assert agent.config.api_key == "test_key"
+    
+    @pytest.mark.parametrize("method,arg,reply,check", [
+        ("chat", "Hello", "Test response",
+         lambda result: result == "Test response"),
+        ("analyze_code", None, "Code analysis result",
+         lambda result: "analysis" in result.lower() or len(result) > 0),
+        ("explain_code", "def hello(): return 'world'", "Code explanation",
+         lambda result: len(result) > 0),
+        ("generate_code", "Fibonacci function",
+         "def fibonacci(n):\n    return n if n < 2 else fibonacci(n-1) + fibonacci(n-2)",
+         lambda result: "def" in result or "function" in result.lower()),
+        ("fix_code", "def broken(): return x / 0", "Fixed code",
+         lambda result: len(result) > 0),
+    ], ids=["chat", "analyze_code", "explain_code", "generate_code", "fix_code"])
+    def test_canned_reply(self, mocked_agent, sample_text_file, method, arg, reply, check):
+        """Test each agent command against a canned model reply."""
+        agent, message = mocked_agent
+        message.content = reply
+        
+        # analyze_code reads a file
+        result = getattr(agent, method)(str(sample_text_file) if arg is None else arg)
+        
+        assert check(result)
 
 
 class TestCommandLineInterface:
     """Test command-line interface."""
     
     @patch('sys.argv', ['agent.py', 'chat', 'Hello'])
-    @patch('openai.OpenAI')
-    def test_chat_command(self, mock_openai):
+    def test_chat_command(self, mock_openai_chat, TerminalAgent):
         """Test chat command."""
-        try:
-            from agent import TerminalAgent
-            
-            mock_client = MagicMock()
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Response"
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            # Test would require running main(), which has side effects
-            # So we'll just verify the structure
-            assert True
-        except ImportError:
-            pytest.skip("Agent not available")
+        mock_openai_chat.content = "Response"
+        
+        # Test would require running main(), which has side effects
+        # So we'll just verify the structure
+        assert True
     
     def test_command_parsing(self):
         """Test command parsing."""
-        commands = ["chat", "analyze", "explain", "generate", "fix", "interactive", "help"]
-        
-        assert "chat" in commands
-        assert "analyze" in commands
-        assert len(commands) >= 5
+        assert "chat" in _COMMANDS
+        assert "analyze" in _COMMANDS
+        assert len(_COMMANDS) >= 5
 
 
 class TestConversationHistory:
@@ -206,27 +135,309 @@ class TestConversationHistory:
         assert len(history) == 3
         assert history[0]["content"] == "First message"
         assert history[2]["content"] == "Second message"
+    
+    def test_history_bounded(self, monkeypatch, TerminalAgent):
+        """Test that the agent keeps only the last history_max_turns turns."""
+        monkeypatch.setenv("TERMINAL_AGENTS_HISTORY_MAX_TURNS", "16")
+        agent = TerminalAgent(use_cache=False)
+        
+        for i in range(100):
+            agent._append_history("user" if i % 2 == 0 else "assistant", f"message {i}")
+        
+        assert len(agent.conversation_history) == 32
+        assert agent.conversation_history[0].content == "message 68"
+        assert agent.conversation_history[-1].content == "message 99"
+    
+    def test_tail_lines_scans_backwards(self):
+        """Test that only the requested trailing lines are returned, in order."""
+        from agent import _tail_lines
+        
+        start, lines = _tail_lines(b'{"a": 1}\n{"b": 2}\n\n{"c": 3}\n', 2)
+        
+        assert lines == [b'{"b": 2}', b'{"c": 3}']
+        assert start == len(b'{"a": 1}\n')
 
 
+@pytest.mark.skipif(not RICH_AVAILABLE, reason="Rich not available")
 class TestRichUI:
     """Test Rich UI functionality."""
     
     def test_rich_import(self):
         """Test Rich library can be imported."""
-        try:
-            from rich.console import Console
-            from rich.panel import Panel
-            from rich.markdown import Markdown
-            assert Console is not None
-        except ImportError:
-            pytest.skip("Rich not available")
+        console = pytest.importorskip("rich.console", reason="Rich not available")
+        pytest.importorskip("rich.panel", reason="Rich not available")
+        pytest.importorskip("rich.markdown", reason="Rich not available")
+        assert console.Console is not None
     
     def test_console_creation(self):
         """Test console creation."""
-        try:
-            from rich.console import Console
-            console = Console()
-            assert console is not None
-        except ImportError:
-            pytest.skip("Rich not available")
+        Console = pytest.importorskip("rich.console", reason="Rich not available").Console
+        console = Console()
+        assert console is not None
+
+
 
+class TestConfig:
+    """Test TerminalAgentConfig."""
+    
+    def test_settings_read_from_injected_env(self):
+        """Test that an injected environment replaces os.environ."""
+        from config import TerminalAgentConfig
+        
+        config = TerminalAgentConfig(env={
+            "LLM_PROVIDER": "Anthropic",
+            "TERMINAL_AGENTS_HISTORY_MAX_TURNS": "4",
+        })
+        
+        assert config.provider == "anthropic"
+        assert config.history_max_turns == 4
+        assert config.detect_best_provider() == "anthropic"
+        assert config.get_provider_config("openai")["api_key"] == ""
+
+
+class TestResponseCache:
+    """Test the two-tier response cache."""
+    
+    def test_memory_and_disk_hits(self, tmp_path):
+        """Test responses survive in memory and are reloaded from disk."""
+        from cache import ResponseCache
+        
+        db_path = tmp_path / "cache.db"
+        cache = ResponseCache(db_path, maxsize=1)
+        key = ResponseCache.make_key("Fake", "fake-1", "Hello")
+        assert cache.get(key) is None
+        
+        cache.set(key, "Hi there!")
+        assert cache.get(key) == "Hi there!"
+        
+        # A fresh instance only has the disk tier to go on
+        assert ResponseCache(db_path).get(key) == "Hi there!"
+    
+    def test_expired_entries_are_ignored(self, tmp_path):
+        """Test that entries older than the TTL are misses."""
+        from cache import ResponseCache
+        
+        cache = ResponseCache(tmp_path / "cache.db", ttl=60)
+        key = ResponseCache.make_key("Fake", "fake-1", "Hello")
+        cache.set(key, "Hi there!")
+        
+        with patch("cache.time.time", return_value=time.time() + 120):
+            assert cache.get(key) is None
+    
+    def test_key_depends_on_history_tail(self):
+        """Test that recent history changes the cache key."""
+        from cache import ResponseCache
+        
+        history = [{"role": "user", "content": "First message"},
+                   {"role": "assistant", "content": "First response"}]
+        assert ResponseCache.make_key("Fake", "fake-1", "Hello") != \
+            ResponseCache.make_key("Fake", "fake-1", "Hello", history)
+    
+    @staticmethod
+    def _cached_agent(TerminalAgent):
+        """An isolated agent with a memory-only cache in front of a mock provider."""
+        from cache import ResponseCache
+        from llm_providers import LLMProvider
+        
+        agent = TerminalAgent(use_cache=False)
+        agent.cache = ResponseCache()
+        agent.llm = Mock(spec=LLMProvider, provider_name="Fake", model_name="fake-1")
+        agent.llm.chat.side_effect = lambda message, **kwargs: f"Reply to {message}"
+        # Isolated requests skip the shared history, so the key only depends on the prompt
+        agent._local.isolated = True
+        return agent
+    
+    def test_repeated_prompt_hits_cache(self, TerminalAgent):
+        """Test that an identical prompt is answered from the cache."""
+        agent = self._cached_agent(TerminalAgent)
+        
+        assert agent.chat("Hello", stream=False) == "Reply to Hello"
+        assert agent.chat("Hello", stream=False) == "Reply to Hello"
+        assert agent.llm.chat.call_count == 1
+    
+    def test_conversation_is_not_cached(self, TerminalAgent):
+        """Test that a repeated prompt within a conversation is sent again."""
+        agent = self._cached_agent(TerminalAgent)
+        agent._local.isolated = False
+        
+        agent.chat("Hello", stream=False)
+        agent.chat("Hello", stream=False)
+        assert agent.llm.chat.call_count == 2
+    
+    def test_key_depends_on_generation_options(self):
+        """Test that the reply cap and stop sequences change the cache key."""
+        from cache import ResponseCache
+        
+        key = ResponseCache.make_key("Fake", "fake-1", "Hello")
+        assert key != ResponseCache.make_key("Fake", "fake-1", "Hello", max_tokens=100)
+        assert key != ResponseCache.make_key("Fake", "fake-1", "Hello", stop=("```",))
+    
+    def test_new_prompt_misses_cache(self, TerminalAgent):
+        """Test that a different prompt still reaches the provider."""
+        agent = self._cached_agent(TerminalAgent)
+        
+        agent.chat("Hello", stream=False)
+        assert agent.chat("Goodbye", stream=False) == "Reply to Goodbye"
+        assert agent.llm.chat.call_count == 2
+
+
+class TestHistoryTrimming:
+    """Test token-budget trimming of conversation history."""
+    
+    def test_trim_history_preserves_system_prompt(self):
+        """Test that system messages survive trimming."""
+        from agent import trim_history
+        from llm_providers import Turn
+        
+        history = [Turn("system", "Be concise.", 3)]
+        for i in range(10):
+            history.append(Turn("user", f"Question {i}", 10))
+            history.append(Turn("assistant", f"Answer {i}", 10))
+        history.append(Turn("user", "Latest question", 10))
+        
+        trimmed = trim_history(history, budget=53)
+        
+        assert trimmed[0] == Turn("system", "Be concise.", 3)
+        assert trimmed[-1].content == "Latest question"
+        assert len(trimmed) < len(history)
+        # Oldest messages go first, and no reply is left without its prompt
+        assert trimmed[1].role == "user"
+        assert trimmed[1].content == "Question 8"
+    
+    def test_trim_history_within_budget_is_unchanged(self):
+        """Test that history under budget is returned as-is."""
+        from agent import trim_history
+        from llm_providers import Turn
+        
+        history = [Turn("user", "Hello", 2), Turn("assistant", "Hi there!", 3), Turn("user", "Bye", 1)]
+        assert trim_history(history, budget=100) is history
+    
+    def test_summarize_turns_keeps_key_lines(self):
+        """Test heuristic summaries keep first sentences and decisions."""
+        from agent import summarize_turns
+        from llm_providers import Turn
+        
+        summary = summarize_turns([
+            Turn("user", "Refactor the parser. It is slow and hard to read."),
+            Turn("assistant", "Sure.\nWe decided to split tokenize() out.\nNothing else changed."),
+        ])
+        
+        assert "Refactor the parser." in summary
+        assert "decided to split tokenize()" in summary
+        assert "hard to read" not in summary
+        assert "Nothing else changed" not in summary
+
+
+class TestMessageNormalization:
+    """Test the message list sent to providers."""
+    
+    def test_current_message_is_not_duplicated(self):
+        """Test that a history ending with the current message is sent as-is."""
+        from llm_providers import Turn, _normalize_messages
+        
+        history = [Turn("user", "Hi"), Turn("assistant", "Hello"), Turn("user", "How are you?")]
+        assert _normalize_messages(history, "How are you?") == tuple(history)
+    
+    def test_prior_turns_are_kept_as_prefix(self):
+        """Test that earlier turns are never dropped or reordered."""
+        from llm_providers import Turn, _normalize_messages
+        
+        history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+        messages = _normalize_messages(history, "Next")
+        
+        assert messages[:2] == (Turn("user", "Hi"), Turn("assistant", "Hello"))
+        assert messages[-1] == Turn("user", "Next")
+
+
+class TestBatchAnalysis:
+    """Test multi-file analysis helpers."""
+    
+    def test_parse_file_reports_skips_non_json_lines(self):
+        """Test that per-file JSON lines are parsed and stray lines ignored."""
+        from agent import _parse_file_reports
+        
+        reports = _parse_file_reports(
+            "```json\n"
+            '{"file": "a.py", "issues": ["Unused import"]}\n'
+            '{"file": "b.py", "issues": []}\n'
+            "```"
+        )
+        
+        assert reports == {"a.py": ["Unused import"], "b.py": []}
+
+
+class TestCodeReplies:
+    """Test how code commands handle replies that end early."""
+    
+    @staticmethod
+    def _agent(TerminalAgent, reply, last_stop):
+        """An agent whose mock provider returns ``reply`` and reports ``last_stop``."""
+        from llm_providers import LLMProvider
+        
+        agent = TerminalAgent(use_cache=False)
+        agent.llm = Mock(spec=LLMProvider, provider_name="Fake", model_name="fake-1", last_stop=last_stop)
+        agent.llm.chat.return_value = reply
+        return agent
+    
+    def test_generate_restores_fence_consumed_by_stop(self, TerminalAgent):
+        """Test a reply ended by the stop sequence yields its code block."""
+        agent = self._agent(TerminalAgent, "```python\nx = 1\n", "```\n\n")
+        
+        assert agent.generate_code("one variable") == "x = 1"
+        assert agent.llm.chat.call_args.kwargs["max_tokens"] is None
+    
+    def test_truncated_reply_is_not_taken_as_complete_code(self, TerminalAgent):
+        """Test an unclosed block that did not end on the stop sequence is returned as-is."""
+        reply = "```python\ndef f():\n    return"
+        agent = self._agent(TerminalAgent, reply, None)
+        
+        assert agent.generate_code("a function") == reply
+
+
+class TestSourceReading:
+    """Test how source files are read into prompts."""
+    
+    def test_only_analysis_elides_large_files(self, monkeypatch, tmp_path, TerminalAgent):
+        """Test fix/refactor input keeps the whole file while analysis keeps head and tail."""
+        agent = TerminalAgent(use_cache=False)
+        monkeypatch.setattr(agent.config, "get_context_window", lambda model: 100)
+        source = tmp_path / "big.py"
+        source.write_text("".join(f"x{i} = {i}\n" for i in range(200)))
+        
+        assert agent._get_code(str(source)) == source.read_text()
+        analyzed = agent._code_for_analysis(str(source))
+        assert "truncated" in analyzed
+        assert analyzed.startswith("x0 = 0\n")
+        assert analyzed.endswith("x199 = 199\n")
+    
+    def test_strip_comment_lines_leaves_strings(self):
+        """Test that only real comment lines are dropped."""
+        from agent import _strip_comment_lines
+        
+        source = 'def f():\n    """Doc.\n    # kept\n    """\n    # dropped\n    return 1  # kept too\n'
+        
+        assert _strip_comment_lines(source) == (
+            'def f():\n    """Doc.\n    # kept\n    """\n    return 1  # kept too\n'
+        )
+
+
+class TestStreaming:
+    """Test streamed output."""
+    
+    def test_stream_coalesces_small_chunks(self, TerminalAgent):
+        """Test that tiny deltas are written in a few batches, skipping empty ones."""
+        from llm_providers import LLMProvider
+        
+        agent = TerminalAgent(use_cache=False)
+        agent.console = None
+        agent.llm = Mock(spec=LLMProvider)
+        agent.llm.stream_chat.return_value = iter(["", "ab"] * 200)
+        
+        writes = []
+        with patch("sys.stdout") as stdout:
+            stdout.write.side_effect = writes.append
+            response = agent._stream_chat("Hello", history=[])
+        
+        assert response == "ab" * 200
+        assert "".join(writes) == "ab" * 200 + "\n"
+        assert len(writes) < 10